@@ -1,2 +1 @@
-python scripts/export_db_json.py
-python scripts/pretranslate_process.py --export_csv
+python scripts/pretranslate_process.py --export_csv --direct
\ No newline at end of file
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import string
+import tempfile
+import time
+
+import export_db_json
+import gakumasu_diff_to_json
+import import_db_json
+import json_format
+from record_walker import walk_record
+
+
+def best_of(func, repeat):
+    """
+    Run func repeat times and return the fastest wall time in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def load_tables(json_dir):
+    """
+    Load the data arrays of every json table under json_dir as {name: records}.
+    """
+    tables = {}
+    for root, dirs, files in os.walk(json_dir):
+        for file in sorted(files):
+            if file.endswith(".json"):
+                with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                    tables[file[:-5]] = json.load(f)["data"]
+    return tables
+
+
+def bench_extractors(json_dir, repeat):
+    """
+    filter_record_fields (per path split + recursive walk) vs compile_field_paths (one walk per record).
+    """
+    tables = load_tables(json_dir)
+    total_old = total_new = 0.0
+    print(f"{'table':<40}{'records':>8}{'paths':>7}{'old ms':>10}{'new ms':>10}{'speedup':>9}")
+    for name, records in tables.items():
+        rule = gakumasu_diff_to_json.primary_key_rules.get(name)
+        if not rule or len(rule) < 2:
+            continue
+        primary_keys, other_keys = rule[0], rule[1]
+        all_keys = primary_keys + other_keys
+        extract = gakumasu_diff_to_json.compile_field_paths(all_keys, other_keys)
+
+        old = [gakumasu_diff_to_json.filter_record_fields(r, all_keys, primary_keys, other_keys) for r in records]
+        if [extract(r) for r in records] != old:
+            raise AssertionError(f"compiled extractor output differs on {name}")
+
+        old_time = best_of(lambda: [gakumasu_diff_to_json.filter_record_fields(r, all_keys, primary_keys, other_keys)
+                                    for r in records], repeat)
+        new_time = best_of(lambda: [extract(r) for r in records], repeat)
+        total_old += old_time
+        total_new += new_time
+        print(f"{name:<40}{len(records):>8}{len(all_keys):>7}{old_time * 1000:>10.1f}{new_time * 1000:>10.1f}"
+              f"{old_time / new_time:>8.2f}x")
+    print(f"{'total':<55}{total_old * 1000:>10.1f}{total_new * 1000:>10.1f}{total_old / total_new:>8.2f}x")
+
+
+def check_need_export_reference(v: str) -> bool:
+    """
+    check_need_export as it was before the isascii/isprintable fast path.
+    """
+    if not v:
+        return False
+
+    allowed_chars = string.ascii_letters + string.digits + string.punctuation + " "
+    for char in v:
+        if char not in allowed_chars:
+            return True
+
+    return False
+
+
+def collect_strings(obj, out: list):
+    if isinstance(obj, str):
+        out.append(obj)
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            collect_strings(v, out)
+    elif isinstance(obj, list):
+        for v in obj:
+            collect_strings(v, out)
+
+
+def bench_need_export(json_dirs, repeat):
+    """
+    check_need_export vs the original per-character implementation over every string leaf.
+    """
+    values = []
+    for json_dir in json_dirs:
+        for records in load_tables(json_dir).values():
+            collect_strings(records, values)
+    # Joined string arrays are checked as well during export
+    values += ["[LA_F]" + "[LA_N_F]".join(v for v in values[i:i + 3]) for i in range(0, len(values), 50)]
+
+    old = [check_need_export_reference(v) for v in values]
+    if [export_db_json.check_need_export(v) for v in values] != old:
+        raise AssertionError("check_need_export results differ from the reference implementation")
+
+    old_time = best_of(lambda: [check_need_export_reference(v) for v in values], repeat)
+    new_time = best_of(lambda: [export_db_json.check_need_export(v) for v in values], repeat)
+    print(f"{len(values)} strings ({sum(old)} need export) from {', '.join(json_dirs)}")
+    print(f"reference: {old_time * 1000:.1f} ms, check_need_export: {new_time * 1000:.1f} ms, "
+          f"{old_time / new_time:.1f}x")
+
+
+def load_roots(json_dir):
+    roots = {}
+    for root, dirs, files in os.walk(json_dir):
+        for file in sorted(files):
+            if file.endswith(".json"):
+                with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                    roots[file] = json.load(f)
+    return roots
+
+
+def every_leaf_map(records, primary_keys) -> dict:
+    """
+    A translation for every text leaf, primary keys included: the worst case of a targeted import.
+    """
+    trans_map = {}
+    for record in records:
+        for full_key, v, _ in walk_record(record, primary_keys):
+            trans_map[full_key] = "EN " + v if isinstance(v, str) else "[LA_F]" + "[LA_N_F]".join("EN " + i for i in v)
+    return trans_map
+
+
+def bench_import(json_dir, data_dir, repeat):
+    """
+    fill_back_translations on every record (full walk) vs fill_translations (baseKey index + paths),
+    with the key:en maps of data_dir and with a translation for every leaf.
+    """
+    roots = load_roots(json_dir)
+    key_en_maps = export_db_json.export_key_maps(data_dir)
+    copy = lambda records: json.loads(json.dumps(records))
+
+    print(f"{'table':<40}{'records':>8}{'trans':>8}{'walk ms':>10}{'index ms':>10}{'all-leaf walk':>15}{'index':>8}")
+    totals = [0.0, 0.0, 0.0, 0.0]
+    for file, root in roots.items():
+        records = root["data"]
+        primary_keys = root["rules"]["primaryKeys"]
+        times = []
+        for trans_map in (key_en_maps.get(file, {}), every_leaf_map(records, primary_keys)):
+            walked, indexed = copy(records), copy(records)
+            for record in walked:
+                import_db_json.fill_back_translations(record, primary_keys, trans_map)
+            import_db_json.fill_translations(indexed, primary_keys, trans_map)
+            if walked != indexed:
+                raise AssertionError(f"targeted import output differs on {file}")
+
+            times.append(best_of(lambda: [import_db_json.fill_back_translations(r, primary_keys, trans_map)
+                                          for r in copy(records)], repeat))
+            times.append(best_of(lambda: import_db_json.fill_translations(copy(records), primary_keys, trans_map),
+                                 repeat))
+        # Both sides include the same copy of the records, which is subtracted
+        copy_time = best_of(lambda: copy(records), repeat)
+        times = [max(t - copy_time, 0.0) for t in times]
+        totals = [a + b for a, b in zip(totals, times)]
+        print(f"{file[:-5]:<40}{len(records):>8}{len(key_en_maps.get(file, {})):>8}"
+              + "".join(f"{t * 1000:>10.1f}" for t in times[:2]) + f"{times[2] * 1000:>15.1f}{times[3] * 1000:>8.1f}")
+    print(f"{'total':<56}" + "".join(f"{t * 1000:>10.1f}" for t in totals[:2])
+          + f"{totals[2] * 1000:>15.1f}{totals[3] * 1000:>8.1f}")
+
+
+def bench_formats(json_dirs, repeat):
+    """
+    Write time and total size of every json table of json_dirs in each json_format output format.
+    """
+    tables = []
+    for json_dir in json_dirs:
+        tables += load_roots(json_dir).values()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{len(tables)} tables from {', '.join(json_dirs)}")
+        print(f"{'format':<10}{'write ms':>10}{'size KB':>10}{'size':>8}")
+        pretty_size = None
+        for fmt in json_format.FORMATS:
+            def write():
+                for n, root in enumerate(tables):
+                    with open(os.path.join(tmp_dir, f"{n}.json"), 'w', encoding='utf-8') as f:
+                        json_format.dump(root, f, indent=2, fmt=fmt)
+            elapsed = best_of(write, repeat)
+            size = sum(os.path.getsize(os.path.join(tmp_dir, f"{n}.json")) for n in range(len(tables)))
+            pretty_size = pretty_size or size
+            print(f"{fmt:<10}{elapsed * 1000:>10.1f}{size / 1024:>10.0f}{size / pretty_size:>8.0%}")
+
+
+def bench_json_backend(json_dirs, repeat):
+    """
+    Load and write (pretty, indent 2 as in data/) time of every json table of json_dirs
+    with orjson vs the standard library.
+    """
+    texts = []
+    for json_dir in json_dirs:
+        for root, dirs, files in os.walk(json_dir):
+            for file in sorted(files):
+                if file.endswith(".json"):
+                    with open(os.path.join(root, file), 'r', encoding='utf-8') as f:
+                        texts.append(f.read())
+    objs = [json.loads(text) for text in texts]
+
+    print(f"{len(texts)} files, {sum(len(t) for t in texts) / 1024:.0f} K characters from {', '.join(json_dirs)}")
+    print(f"{'backend':<10}{'load ms':>10}{'write ms':>10}")
+    for backend in ("json", "orjson"):
+        os.environ[json_format.BACKEND_ENV] = backend
+        if json_format.get_backend() != backend:
+            print(f"{backend:<10}{'not installed':>20}")
+            continue
+        load_time = best_of(lambda: [json_format.loads(text) for text in texts], repeat)
+        write_time = best_of(lambda: [json_format.dumps(obj, indent=2, fmt="pretty") for obj in objs], repeat)
+        print(f"{backend:<10}{load_time * 1000:>10.1f}{write_time * 1000:>10.1f}")
+    os.environ.pop(json_format.BACKEND_ENV)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the conversion scripts")
+    parser.add_argument('benchmark', choices=['extractors', 'need-export', 'import', 'formats', 'json-backend'])
+    parser.add_argument('--json-dir', default="gakumasu-diff/json")
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.benchmark == 'extractors':
+        bench_extractors(args.json_dir, args.repeat)
+    elif args.benchmark == 'need-export':
+        bench_need_export([args.data_dir, args.json_dir], args.repeat)
+    elif args.benchmark == 'import':
+        bench_import(args.json_dir, args.data_dir, args.repeat)
+    elif args.benchmark == 'formats':
+        bench_formats([args.data_dir], args.repeat)
+    elif args.benchmark == 'json-backend':
+        bench_json_backend([args.data_dir, args.json_dir], args.repeat)
+
+
+if __name__ == '__main__':
+    main()
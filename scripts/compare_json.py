@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import os
+import sys
+
+import json_format
+from job_pool import add_jobs_argument, resolve_jobs, run_jobs
+from record_walker import build_base_key, path_strings
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def diff_paths(a, b, path=(), out=None) -> list:
+    """
+    The paths (raw path strings such as 'produceDescriptions[0].text') where two json values differ.
+    """
+    if out is None:
+        out = []
+    if a == b:
+        return out
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in list(a) + [k for k in b if k not in a]:
+            if k not in a or k not in b:
+                out.append(path_strings(path + (k,))[0])
+            else:
+                diff_paths(a[k], b[k], path + (k,), out)
+    elif isinstance(a, list) and isinstance(b, list):
+        for idx in range(max(len(a), len(b))):
+            if idx >= len(a) or idx >= len(b):
+                out.append(path_strings(path + (idx,))[0])
+            else:
+                diff_paths(a[idx], b[idx], path + (idx,), out)
+    else:
+        out.append(path_strings(path)[0])
+    return out
+
+
+def is_table(obj) -> bool:
+    return (isinstance(obj, dict) and isinstance(obj.get("data"), list)
+            and isinstance(obj.get("rules"), dict) and "primaryKeys" in obj["rules"])
+
+
+def diff_records(json1, json2) -> dict:
+    """
+    Record-level diff of two loaded json files.
+    Tables (rules.primaryKeys + data) are compared record by record keyed by their baseKey
+    (records sharing a baseKey are paired in order); other objects key by key.
+    Returns {"added": [key, ...], "removed": [key, ...], "changed": {key: [path, ...]}}.
+    """
+    if is_table(json1) and is_table(json2):
+        records1, records2 = {}, {}
+        for records, data, rules in ((records1, json1["data"], json1["rules"]), (records2, json2["data"], json2["rules"])):
+            for record in data:
+                records.setdefault(build_base_key(record, rules["primaryKeys"]), []).append(record)
+        changed = {}
+        if json1["rules"] != json2["rules"]:
+            changed["rules"] = diff_paths(json1["rules"], json2["rules"], ("rules",))
+    elif isinstance(json1, dict) and isinstance(json2, dict):
+        records1 = {k: [v] for k, v in json1.items()}
+        records2 = {k: [v] for k, v in json2.items()}
+        changed = {}
+    else:
+        return {"added": [], "removed": [], "changed": {"": [""]}}
+
+    added, removed = [], []
+    for key in list(records1) + [k for k in records2 if k not in records1]:
+        list1, list2 = records1.get(key, []), records2.get(key, [])
+        for idx in range(max(len(list1), len(list2))):
+            label = key if idx == 0 else f"{key} (#{idx + 1})"
+            if idx >= len(list1):
+                added.append(label)
+            elif idx >= len(list2):
+                removed.append(label)
+            elif list1[idx] != list2[idx]:
+                changed[label] = diff_paths(list1[idx], list2[idx])
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def compare_file(path1: str, path2: str) -> dict:
+    """
+    Compare one json file of both folders; they are only parsed if their size or content hash differs.
+    Returns {"file", "status", "added", "removed", "changed", "error"} with status
+    "identical" (same bytes), "equal" (same json, different formatting), "changed" or "error".
+    """
+    result = {"file": os.path.basename(path1), "status": "identical",
+              "added": [], "removed": [], "changed": {}, "error": None}
+    try:
+        if os.path.getsize(path1) == os.path.getsize(path2) and file_digest(path1) == file_digest(path2):
+            return result
+
+        with open(path1, 'r', encoding='utf-8') as f1, open(path2, 'r', encoding='utf-8') as f2:
+            json1 = json_format.load(f1)
+            json2 = json_format.load(f2)
+        if json1 == json2:
+            result["status"] = "equal"
+            return result
+
+        result.update(diff_records(json1, json2))
+        result["status"] = "changed"
+    except (OSError, ValueError) as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+
+def compare_folders(folder1, folder2, jobs=1) -> dict:
+    """
+    Compare the json files of two folders, in a process pool when jobs > 1.
+
+    Returns a dictionary containing the comparison results:
+    - "matched": files with the same content in the two folders (same bytes or same json).
+    - "mismatched": files with different content (or that could not be read).
+    - "missing_in_folder2": files that exist in folder1 but not in folder2.
+    - "missing_in_folder1": files that exist in folder2 but not in folder1.
+    - "results": the compare_file result of every common file, in file name order.
+    """
+    files1 = {f for f in os.listdir(folder1) if f.endswith('.json')}
+    files2 = {f for f in os.listdir(folder2) if f.endswith('.json')}
+    common_files = sorted(files1 & files2)
+
+    paths1 = [os.path.join(folder1, f) for f in common_files]
+    paths2 = [os.path.join(folder2, f) for f in common_files]
+    results = list(run_jobs(compare_file, zip(paths1, paths2), jobs))
+
+    return {
+        "matched": [r["file"] for r in results if r["status"] in ("identical", "equal")],
+        "mismatched": [r["file"] for r in results if r["status"] in ("changed", "error")],
+        "missing_in_folder2": sorted(files1 - files2),
+        "missing_in_folder1": sorted(files2 - files1),
+        "results": results,
+    }
+
+
+def print_report(comparison: dict, max_records=20):
+    identical = sum(r["status"] == "identical" for r in comparison["results"])
+    print(f"Matched files: {len(comparison['matched'])} ({identical} byte-identical)")
+    for result in comparison["results"]:
+        if result["status"] == "error":
+            print(f"Error comparing {result['file']}: {result['error']}")
+        elif result["status"] == "changed":
+            print(f"Mismatched {result['file']}: {len(result['added'])} added, {len(result['removed'])} removed, "
+                  f"{len(result['changed'])} changed records")
+            lines = ([f"  + {key}" for key in result["added"]] + [f"  - {key}" for key in result["removed"]]
+                     + [f"  ~ {key}: {', '.join(paths)}" for key, paths in result["changed"].items()])
+            for line in lines[:max_records]:
+                print(line)
+            if len(lines) > max_records:
+                print(f"  ... {len(lines) - max_records} more")
+    if comparison["missing_in_folder2"]:
+        print("Missing in folder2:", comparison["missing_in_folder2"])
+    if comparison["missing_in_folder1"]:
+        print("Missing in folder1:", comparison["missing_in_folder1"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the json files of two folders record by record")
+    parser.add_argument('folder1')
+    parser.add_argument('folder2')
+    add_jobs_argument(parser)
+    parser.add_argument('--max-records', type=int, default=20,
+                        help="Number of record differences listed per file")
+    args = parser.parse_args()
+    comparison = compare_folders(args.folder1, args.folder2, resolve_jobs(args.jobs))
+    print_report(comparison, args.max_records)
+    if comparison["mismatched"] or comparison["missing_in_folder1"] or comparison["missing_in_folder2"]:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,9 @@ import json
 import csv
 import sys
 import pathlib
-from concurrent.futures import ThreadPoolExecutor
+
+import json_format
+from job_pool import resolve_jobs, run_jobs
 
 CSV_HEADER = ['source', 'translatedstr']
 
@@ -21,35 +23,13 @@ def read_json(filepath):
     """
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            return json_format.load(f)
 
     except FileNotFoundError:
         raise FileNotFoundError(f"JSON file not found at {filepath}")
     except json.JSONDecodeError:
         raise json.JSONDecodeError(f"Invalid JSON format in {filepath}")
 
-def read_csv(filepath):
-    """Reads a CSV file and returns its content as a list of dictionaries.
-
-    Args:
-        filepath (str): The path to the CSV file.
-
-    Returns:
-        list: A list of dictionaries representing the rows.
-
-    Raises:
-        FileNotFoundError: If the file does not exist.
-        csv.Error: If there is an error parsing the CSV.
-    """
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            return list(reader)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"CSV file not found at {filepath}")
-    except csv.Error as e:
-        raise csv.Error(f"Error parsing CSV file {filepath}: {e}")
-
 def write_json(filepath, data):
     """Writes data to a JSON file.
 
@@ -62,7 +42,7 @@ def write_json(filepath, data):
     """
     try:
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+            json_format.dump(data, f, indent=4)
     except IOError as e:
         raise IOError(f"Error writing to JSON file {filepath}: {e}")
 
@@ -97,31 +77,52 @@ def json_to_csv(json_filepath, csv_filepath):
         csv_filepath (str): The path to the output CSV file.
     """
     data = read_json(json_filepath)
-    csv_data = [{'source': key, 'translatedstr': value} for key, value in data.items()]
-    write_csv(csv_filepath, csv_data, CSV_HEADER)
+    write_csv(csv_filepath, data, CSV_HEADER)
 
 def csv_to_json(csv_filepath, json_filepath):
     """Converts a CSV file to a JSON file, handling missing 'translatedstr' and empty values.
 
+    The rows are read one at a time from the CSV reader into the output mapping.
+
     Args:
         csv_filepath (str): The path to the input CSV file.
         json_filepath (str): The path to the output JSON file.
+
+    Returns:
+        int: The number of rows converted.
+
+    Raises:
+        ValueError: If the CSV file has no header or no translation column.
     """
-    data = read_csv(csv_filepath)
     json_data = {}
-    header = list(data[0].keys()) # Get the header keys
-    source_key = header[0] # 'source' key
-    translated_key = header[1] # 'translatedstr' key
-    for row in data:
-        source_text = row[source_key]
-        if translated_key in row:
-            json_data[source_text] = row[translated_key]
-        else:
-            print(f'ERROR: File {csv_filepath} - Could not find {translated_key} in row:', row)
-            json_data[source_text] = ''  # Handle missing 'translatedstr' as empty string
+    rows = 0
+    with open(csv_filepath, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames
+        if not header:
+            raise ValueError(f"CSV file {csv_filepath} is empty")
+        if len(header) < 2:
+            raise ValueError(f"CSV file {csv_filepath} has no translation column: {header}")
+        source_key = header[0] # 'source' key
+        translated_key = header[1] # 'translatedstr' key
+        try:
+            for row in reader:
+                json_data[row[source_key]] = row[translated_key]
+                rows += 1
+        except csv.Error as e:
+            raise csv.Error(f"Error parsing CSV file {csv_filepath} (line {reader.line_num}): {e}")
     write_json(json_filepath, json_data)
+    return rows
+
+def convert_csv_file(csv_filepath, json_filepath):
+    """Converts a single CSV file; used by the (parallel) mass conversion.
+
+    Returns:
+        dict: {"rows"}
+    """
+    return {"rows": csv_to_json(csv_filepath, json_filepath)}
 
-def mass_csv_to_json(csv_folder, json_folder=None):
+def mass_csv_to_json(csv_folder, json_folder=None, jobs=1):
     """
     Converts all CSV files in a folder to JSON files.
 
@@ -129,6 +130,10 @@ def mass_csv_to_json(csv_folder, json_folder=None):
         csv_folder (str): Path to the folder containing CSV files.
         json_folder (str, optional): Path to the folder where JSON files will be saved.
                                      If None, uses the same folder as csv_folder.
+        jobs (int): Number of worker processes, the files are converted in this process if 1.
+
+    Returns:
+        list: The per-file results {"input", "output", "rows", "seconds", "error"}, in file order.
     """
     csv_folder_path = pathlib.Path(csv_folder)
     json_folder_path = pathlib.Path(json_folder) if json_folder else csv_folder_path
@@ -136,17 +141,54 @@ def mass_csv_to_json(csv_folder, json_folder=None):
     if not csv_folder_path.is_dir():
         raise ValueError(f"The provided CSV folder path is not a directory: {csv_folder}")
 
-    csv_files = list(csv_folder_path.glob("*.csv"))
+    csv_files = sorted(csv_folder_path.glob("*.csv"))
 
     if not csv_files:
         print(f"No CSV files found in {csv_folder}")
-        return
+        return []
+
+    inputs = [str(csv_file) for csv_file in csv_files]
+    outputs = [str(json_folder_path / f"{csv_file.stem}_translated.json") for csv_file in csv_files]
+    collected = []
+    results = run_jobs(convert_csv_file, zip(inputs, outputs), jobs, errors=(OSError, csv.Error, ValueError),
+                       result=lambda i, o: {"input": i, "output": o, "rows": 0})
+    for result in results:
+        if result["error"]:
+            print(f"Conversion failed: {result['input']}: {result['error']}")
+        else:
+            print(f"Converted {result['input']} to {result['output']} "
+                  f"({result['rows']} rows, {result['seconds']:.2f}s)")
+        collected.append(result)
+
+    failed = [r for r in collected if r["error"]]
+    print(f"Converted {len(collected) - len(failed)}/{len(collected)} files, "
+          f"{sum(r['rows'] for r in collected)} rows")
+    return collected
 
-    with ThreadPoolExecutor() as executor:
-        for csv_file in csv_files:
-            json_file = json_folder_path / f"{csv_file.stem}_translated.json"
-            print(f'Converting {csv_file} to JSON...')
-            executor.submit(csv_to_json, str(csv_file), str(json_file))
+MASS_CONVERT_USAGE = "usage: csv_json_bridge.py --mass_convert [csv folder] [json folder] [--jobs N]"
+
+def pop_jobs_argument(args):
+    """Removes --jobs/-j N from the argument list, exiting with the usage if N is missing or not a number.
+
+    Returns:
+        int: The number of worker processes (0 = one per CPU).
+    """
+    jobs = 1
+    for flag in ("--jobs", "-j"):
+        while flag in args:
+            idx = args.index(flag)
+            if idx + 1 >= len(args):
+                print(MASS_CONVERT_USAGE)
+                print("csv_json_bridge.py: error: argument --jobs/-j: expected one argument")
+                sys.exit(2)
+            try:
+                jobs = int(args[idx + 1])
+            except ValueError:
+                print(MASS_CONVERT_USAGE)
+                print(f"csv_json_bridge.py: error: argument --jobs/-j: invalid int value: '{args[idx + 1]}'")
+                sys.exit(2)
+            del args[idx:idx + 2]
+    return resolve_jobs(jobs)
 
 def main():
     """
@@ -154,9 +196,16 @@ def main():
     """
     if len(sys.argv) > 1:
         if sys.argv[1] == "--mass_convert":
-            input_folder = sys.argv[2] if len(sys.argv) > 2 else "./pretranslate_todo/full_out"
-            output_folder = sys.argv[3] if len(sys.argv) > 3 else None
-            mass_csv_to_json(input_folder, output_folder)
+            args = sys.argv[2:]
+            jobs = pop_jobs_argument(args)
+            input_folder = args[0] if len(args) > 0 else "./pretranslate_todo/full_out"
+            output_folder = args[1] if len(args) > 1 else None
+            results = mass_csv_to_json(input_folder, output_folder, jobs)
+            failed = [r for r in results if r["error"]]
+            if failed:
+                for result in failed:
+                    print(f"  {result['input']}: {result['error']}")
+                sys.exit(1)
         else:
             first_file = pathlib.Path(sys.argv[1])
             second_file = pathlib.Path(sys.argv[2]) if len(sys.argv) > 2 else None
@@ -1,30 +1,24 @@
-import json
+import argparse
 import sys
 import os
-import re
-import string
 
-def path_normalize_for_pk(path_str: str) -> str:
-    """
-    Converts something like 'produceDescriptions[0].produceDescriptionType'
-    to 'produceDescriptions.produceDescriptionType'
-    removing only the [number] layer so it matches primaryKeys.
-    """
-    return re.sub(r"\[\d+\]", "", path_str)
+import json_format
+from job_pool import add_jobs_argument, resolve_jobs, run_jobs
+from record_walker import walk_record
+from translation_memory import DEFAULT_TM_PATH, TranslationMemory, table_name
+
 
 def check_need_export(v: str) -> bool:
+    """
+    A value needs exporting if it contains anything besides
+    string.ascii_letters + string.digits + string.punctuation + " ",
+    i.e. anything outside the printable ASCII range 0x20-0x7E.
+    """
     if not v:
         return False
 
-    # Define the allowed character set
-    allowed_chars = string.ascii_letters + string.digits + string.punctuation + " "
-
-    # Check if all characters are in the allowed character set
-    for char in v:
-        if char not in allowed_chars:
-            return True
-
-    return False
+    # For ASCII strings isprintable() is exactly the 0x20-0x7E check
+    return not (v.isascii() and v.isprintable())
 
 
 def collect_translatable_text(data_obj, primary_keys):
@@ -35,109 +29,146 @@ def collect_translatable_text(data_obj, primary_keys):
 
     result = {}
 
-    # 1) Store primaryKeys in a set for quick judgment later
-    pk_set = set(primary_keys)
+    # Non-primary key, non-empty string fields; string arrays are joined into one [LA_F] value
+    for fullKey, v, _ in walk_record(data_obj, primary_keys, skip_primary_keys=True):
+        if not isinstance(v, str):
+            v = "[LA_F]" + "[LA_N_F]".join(v)
+        if check_need_export(v):
+            result[fullKey] = v
 
-    # 2) Build baseKey (put all primary key values together)
-    pk_parts = []
-    for pk in primary_keys:
-        if "." not in pk:
-            val = data_obj.get(pk, "")
-            pk_parts.append(str(val))
-        else:
-            top_level, sub_field = pk.split(".", 1)
-            top_val = data_obj.get(top_level, None)
-            if isinstance(top_val, list) and len(top_val) > 0 and isinstance(top_val[0], dict):
-                sub_val = top_val[0].get(sub_field, "")
-                pk_parts.append(str(sub_val))
-            elif isinstance(top_val, dict):
-                sub_val = top_val.get(sub_field, "")
-                pk_parts.append(str(sub_val))
-            else:
-                pk_parts.append("")
-
-    baseKey = "|".join(pk_parts)
-
-    # 3) Recursively traverse to find non-primary key, non-empty string fields
-    def traverse(obj, prefix=""):
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                new_prefix = prefix + "." + k if prefix else k
-                if isinstance(v, str):
-                    # If the string is empty, skip it
-                    if not check_need_export(v):
-                        continue
-                    # Process array index => produceDescriptions[0].xxx -> produceDescriptions.xxx
-                    normalized_path = path_normalize_for_pk(new_prefix)
-                    # If it is pk, skip
-                    if normalized_path not in pk_set:
-                        fullKey = baseKey + "|" + new_prefix
-                        result[fullKey] = v
-                elif isinstance(v, list):
-                    if (len(v) > 0) and (not isinstance(v[0], str)):
-                        traverse(v, new_prefix)
-                    else:
-                        new_v = "[LA_N_F]".join(v)
-                        new_v = f"[LA_F]{new_v}"
-                        # If the string is empty, skip it
-                        if not check_need_export(new_v):
-                            continue
-                        # Process array index => produceDescriptions[0].xxx -> produceDescriptions.xxx
-                        normalized_path = path_normalize_for_pk(new_prefix)
-                        # If it is pk, skip
-                        if normalized_path not in pk_set:
-                            fullKey = baseKey + "|" + new_prefix
-                            result[fullKey] = new_v
-
-                elif isinstance(v, dict):
-                    traverse(v, new_prefix)
-        elif isinstance(obj, list):
-            for idx, item in enumerate(obj):
-                new_prefix = prefix + f"[{idx}]"
-                if isinstance(item, (dict, list)):
-                    traverse(item, new_prefix)
-
-    traverse(data_obj)
     return result
 
-def ex_main(input_json, output_json):
+class ExportError(Exception):
+    pass
+
+
+def export_translatable_text(input_json) -> dict:
+    """
+    Load a gakumasu-diff style json file and return its { fullKey: textValue } map.
+    Raises ExportError if the file is missing or does not have the expected structure.
+    """
     if not os.path.isfile(input_json):
-        print(f"Input file not found: {input_json}")
-        sys.exit(1)
+        raise ExportError(f"Input file not found: {input_json}")
 
     with open(input_json, "r", encoding="utf-8") as f:
-        root = json.load(f)
+        try:
+            root = json_format.load(f)
+        except ValueError as e:
+            raise ExportError(f"Invalid json: {e}")
 
     if "rules" not in root or "primaryKeys" not in root["rules"]:
-        print("Missing rules.primaryKeys, may not be the expected structure")
-        sys.exit(1)
+        raise ExportError("Missing rules.primaryKeys, may not be the expected structure")
 
     primary_keys = root["rules"]["primaryKeys"]
     if "data" not in root or not isinstance(root["data"], list):
-        print("The data array is missing and may not be the expected structure.")
-        sys.exit(1)
+        raise ExportError("The data array is missing and may not be the expected structure.")
 
     export_dict = {}
     for row in root["data"]:
         row_dict = collect_translatable_text(row, primary_keys)
         export_dict.update(row_dict)
+    return export_dict
+
 
+def export_key_maps(json_dir: str) -> dict:
+    """
+    Export every json table under json_dir in memory.
+    Returns { file name: { fullKey: text } }.
+    """
+    key_maps = {}
+    for root, dirs, files in os.walk(json_dir):
+        for file in files:
+            if file.endswith(".json"):
+                input_path = os.path.join(root, file)
+                try:
+                    key_maps[file] = export_translatable_text(input_path)
+                except ExportError as e:
+                    print(f"{input_path}: {e}")
+                    sys.exit(1)
+    return key_maps
+
+
+def write_export(export_dict: dict, output_json):
     with open(output_json, "w", encoding="utf-8") as out:
-        json.dump(export_dict, out, ensure_ascii=False, indent=2)
+        json_format.dump(export_dict, out, indent=2)
+
+
+def ex_main(input_json, output_json):
+    try:
+        export_dict = export_translatable_text(input_json)
+    except ExportError as e:
+        print(e)
+        sys.exit(1)
+
+    write_export(export_dict, output_json)
 
     print(f"Export completed: {output_json} (total {len(export_dict)} entries)")
 
-def main():
-    orig_dir = sys.argv[1] if len(sys.argv) > 1 else "gakumasu-diff/json"
-    if not os.path.isdir("./exports"):
-        os.mkdir("./exports")
 
+def export_file(input_json, output_json) -> dict:
+    """
+    Export a single file; used by the (parallel) directory export. Returns {"entries", "bytes"}.
+    """
+    export_dict = export_translatable_text(input_json)
+    write_export(export_dict, output_json)
+    return {"entries": len(export_dict), "bytes": os.path.getsize(output_json)}
+
+
+def export_directory(orig_dir="gakumasu-diff/json", output_dir="./exports", jobs=1) -> list:
+    """
+    Export every json file under orig_dir into output_dir, in a process pool when jobs > 1.
+    A failing file does not stop the others; the per-file results
+    {"input", "output", "entries", "bytes", "seconds", "error"} are returned in walk order.
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    inputs, outputs = [], []
     for root, dirs, files in os.walk(orig_dir):
         for file in files:
             if file.endswith(".json"):
-                input_path = os.path.join(root, file)
-                output_path = os.path.join("./exports", file)
-                ex_main(input_path, output_path)
+                inputs.append(os.path.join(root, file))
+                outputs.append(os.path.join(output_dir, file))
+
+    collected = []
+    results = run_jobs(export_file, zip(inputs, outputs), jobs, errors=(ExportError, OSError),
+                       result=lambda i, o: {"input": i, "output": o, "entries": 0, "bytes": 0})
+    for result in results:
+        if result["error"]:
+            print(f"Export failed: {result['input']}: {result['error']}")
+        else:
+            print(f"Export completed: {result['output']} (total {result['entries']} entries, "
+                  f"{result['bytes']} bytes, {result['seconds']:.2f}s)")
+        collected.append(result)
+    return collected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('orig_dir', nargs='?', default="gakumasu-diff/json")
+    add_jobs_argument(parser)
+    parser.add_argument('--tm', nargs='?', const=DEFAULT_TM_PATH, metavar="PATH",
+                        help="Also record the exported texts as source texts in the translation memory")
+    json_format.add_format_argument(parser)
+    args = parser.parse_args()
+    json_format.apply_format_argument(args)
+
+    results = export_directory(args.orig_dir, "./exports", resolve_jobs(args.jobs))
+
+    if args.tm:
+        with TranslationMemory(args.tm) as tm:
+            for result in results:
+                if not result["error"]:
+                    with open(result["output"], "r", encoding="utf-8") as f:
+                        tm.set_sources(table_name(os.path.basename(result["output"])), json_format.load(f))
+
+    failed = [r for r in results if r["error"]]
+    print(f"Exported {len(results) - len(failed)}/{len(results)} files, "
+          f"{sum(r['entries'] for r in results)} entries")
+    if failed:
+        for result in failed:
+            print(f"  {result['input']}: {result['error']}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
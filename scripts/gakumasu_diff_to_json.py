@@ -1,9 +1,18 @@
+import argparse
+import hashlib
 import json
 import os
 import re
+import subprocess
+import sys
+import tempfile
 import yaml
-from typing import List
-from yaml.reader import Reader
+from concurrent.futures import ProcessPoolExecutor
+from yaml.composer import Composer
+from yaml.events import SequenceEndEvent, SequenceStartEvent, StreamEndEvent
+
+import json_format
+from job_pool import add_jobs_argument, resolve_jobs
 
 """
 Format
@@ -354,20 +363,108 @@ primary_key_rules = {
 TestMode = False
 
 class CustomLoader(yaml.SafeLoader):
-    def __init__(self, stream):
-        # Override initialization to support specific control characters
-        super().__init__(stream)
+    # Allow for non-printable characters (like #x000b): Reader.check_printable validates whole
+    # chunks against this pattern, which is Reader.NON_PRINTABLE plus the C0 / C1 control characters.
+    # NUL stays rejected, the reader takes it for the end of the stream.
+    NON_PRINTABLE = re.compile('[^\x01-\uD7FF\uE000-\uFFFD\U00010000-\U0010ffff]')
+
+
+# The control characters CustomLoader allows on top of Reader.NON_PRINTABLE. libyaml rejects them
+# outright, so before parsing they are swapped for the private use character U+E000 + code point
+# and swapped back when the strings are constructed.
+CONTROL_CHARS = "".join(chr(c) for c in range(0x01, 0xA0)
+                        if not (c in (0x09, 0x0A, 0x0D, 0x85) or 0x20 <= c <= 0x7E))
+CONTROL_PATTERN = re.compile("[" + re.escape(CONTROL_CHARS) + "]")
+CONTROL_PLACEHOLDER_PATTERN = re.compile("[\ue000-\ue09f]")
+HIDE_CONTROL_CHARS = {ord(c): 0xE000 + ord(c) for c in CONTROL_CHARS}
+RESTORE_CONTROL_CHARS = {0xE000 + ord(c): ord(c) for c in CONTROL_CHARS}
+
+
+def hide_control_chars(text: str) -> str:
+    return text.translate(HIDE_CONTROL_CHARS) if CONTROL_PATTERN.search(text) else text
+
 
-    def check_printable(self, data):
+if yaml.__with_libyaml__:
+    class FastLoader(yaml.CSafeLoader):
         """
-        Rewrite the check function to allow for non-printable characters (like #x000b)
+        CSafeLoader (libyaml) that restores the control characters hidden by hide_control_chars
         """
-        for char in data:
-            if char == "\x0b":  # Allow vertical tabs
-                continue
-            if not super().check_printable(char):
-                return False
-        return True
+        def construct_yaml_str(self, node):
+            value = self.construct_scalar(node)
+            # str.translate is slow, most strings have nothing to restore
+            if CONTROL_PLACEHOLDER_PATTERN.search(value):
+                return value.translate(RESTORE_CONTROL_CHARS)
+            return value
+
+    FastLoader.add_constructor('tag:yaml.org,2002:str', FastLoader.construct_yaml_str)
+else:
+    FastLoader = None
+
+
+TAB_VALUE_PATTERN = re.compile(r': (\t.*)')
+
+
+def read_yaml_content(file_path: str) -> str:
+    """
+    Read a master YAML file and apply the fixes needed before parsing.
+    """
+    # Preprocess file: replace tabs with 4 spaces
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    content = TAB_VALUE_PATTERN.sub(r': "\1"', content)  # Replace tab characters
+    content = content.replace("|\n", "|+\n") # Fix literal strings newline chomping
+    return content
+
+
+def load_yaml(content: str, use_libyaml=True):
+    """
+    Parse preprocessed YAML content, using libyaml when it is available.
+    Falls back to CustomLoader if libyaml is missing or rejects the document.
+    """
+    if use_libyaml and FastLoader is not None and not CONTROL_PLACEHOLDER_PATTERN.search(content):
+        try:
+            return yaml.load(hide_control_chars(content), FastLoader)
+        except yaml.YAMLError:
+            pass
+    return yaml.load(content, CustomLoader)
+
+
+# Control characters in plain, quoted and flow scalars and in a key
+LOADER_PARITY_SAMPLE = '- a: x\x0cy\x1bz\x0b\n  b: "\x01\x7f\x90"\n  c: [\x1b]\n  d\x08: e\n'
+
+
+def check_loader_parity(folder_path="./gakumasu-diff/orig"):
+    """
+    Parse LOADER_PARITY_SAMPLE and every YAML file with both FastLoader and CustomLoader
+    and compare the results. Returns the list of files whose parsed data differs.
+    """
+    if FastLoader is None:
+        print("PyYAML was built without libyaml, nothing to compare.")
+        return []
+
+    sources = [("<control character sample>", LOADER_PARITY_SAMPLE)]
+    for root, _, files in os.walk(folder_path):
+        for file in files:
+            if file.endswith('.yaml'):
+                file_path = os.path.join(root, file)
+                sources.append((file_path, read_yaml_content(file_path)))
+
+    mismatched = []
+    for file_path, content in sources:
+        try:
+            fast = yaml.load(hide_control_chars(content), FastLoader)
+        except yaml.YAMLError as e:
+            print(f"libyaml failed on {file_path}: {e}")
+            mismatched.append(file_path)
+            continue
+        pure = yaml.load(content, CustomLoader)
+        # Compare serialized forms so that e.g. 1 and True are not considered equal
+        if json.dumps(fast, ensure_ascii=False) != json.dumps(pure, ensure_ascii=False):
+            print(f"Loader mismatch: {file_path}")
+            mismatched.append(file_path)
+
+    print(f"Loader parity: {len(mismatched)} mismatched file(s)")
+    return mismatched
 
 
 def save_json(data: list, name: str):
@@ -391,46 +488,26 @@ def save_json(data: list, name: str):
     # Merge all fields to be retained (first item + second item)
     all_keys = primary_keys + other_keys
 
-    processed_data = []
-    for record in data:
-        # Construct a new object for the current record, containing only the required fields
-        filtered_record = filter_record_fields(
-            record,
-            all_keys,
-            primary_keys,
-            other_keys
-        )
-
-        # empty string arrays fix
-        if name == "ProduceStory" and "produceEventHintProduceConditionDescriptions" in filtered_record:
-            desc_array = filtered_record["produceEventHintProduceConditionDescriptions"]
-            if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
-                filtered_record["produceEventHintProduceConditionDescriptions"] = []
-
-        if name == "Tutorial" and "texts" in filtered_record:
-            desc_array = filtered_record["texts"]
-            if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
-                filtered_record["texts"] = []
-
-        if name == "ConditionSet" and "description" in filtered_record:
-            desc_array = filtered_record["description"]
-            if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
-                filtered_record["description"] = []
-
-        if name == "IdolCardSkin" and "name" in filtered_record:
-            desc_array = filtered_record["name"]
-            if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
-                filtered_record["name"] = []
-
-        processed_data.append(filtered_record)
+    # Construct a new object for each record, containing only the required fields
+    extract = compile_field_paths(all_keys, other_keys)
 
     # Make sure the first data has all keys
     # This can be removed when the app can parse all keys(also key type) properly.
     # Currently, there is a bug on finding type and local keys from data
     # We must make sure the first data has all keys
-    if not sort_records_fields(processed_data, all_keys):
-        print(f"Failed to find super key object from {name}")
-        
+    finder = SuperKeyFinder(all_keys)
+
+    processed_data = []
+    for record in data:
+        filtered_record = filter_table_record(record, name, extract)
+        finder.feed(len(processed_data), filtered_record)
+        processed_data.append(filtered_record)
+
+    if finder.index is None:
+        finder.report_missing(name)
+    elif finder.index:
+        processed_data.insert(0, processed_data.pop(finder.index))
+
     # Generate the final JSON structure
     
     result = {
@@ -443,45 +520,130 @@ def save_json(data: list, name: str):
     # Write JSON files
     os.makedirs('./gakumasu-diff/json', exist_ok=True)
     with open(f'gakumasu-diff/json/{name}.json', 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=4)
+        json_format.dump(result, f, indent=4)
     return f'gakumasu-diff/json/{name}.json'
 
-def sort_records_fields(records: List[dict], field_paths: list):
-    def hasPaths(record:dict, path:list):
-        if not path:
-            return False
-        key = path[0]
-        if not isinstance(record, dict) or key not in record:
-            return False
-        record_value = record[key]
-        # No more sub object, we find all objects from record by path
-        if len(path) == 1:
-            return True
-        
-        # If there is obj use traversal to find value
-        if isinstance(record_value, dict):
-            return hasPaths(record_value, path[1:])
-
-        # When obj is list, check all elements
-        if isinstance(record_value, list):
-            for item in record_value:
-                if isinstance(item, dict):
-                    if hasPaths(item, path[1:]):
-                        # it has all subkeys
-                        return True
-        # Failed to find value by key
-        return False
-    for idx in range(len(records)):
-        hasAllField = True
-        for paths in field_paths:
-            path = paths.split(".") 
-            if not hasPaths(records[idx], path):
-                hasAllField = False
-                break
-        if hasAllField:
-            records.insert(0, records.pop(idx))
-            return True
-    return False
+def filter_table_record(record: dict, name: str, extract) -> dict:
+    """
+    Field filtering (extract comes from compile_field_paths) plus the per-table fixes
+    applied to every record of name.
+    """
+    filtered_record = extract(record)
+
+    # empty string arrays fix
+    if name == "ProduceStory" and "produceEventHintProduceConditionDescriptions" in filtered_record:
+        desc_array = filtered_record["produceEventHintProduceConditionDescriptions"]
+        if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
+            filtered_record["produceEventHintProduceConditionDescriptions"] = []
+
+    if name == "Tutorial" and "texts" in filtered_record:
+        desc_array = filtered_record["texts"]
+        if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
+            filtered_record["texts"] = []
+
+    if name == "ConditionSet" and "description" in filtered_record:
+        desc_array = filtered_record["description"]
+        if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
+            filtered_record["description"] = []
+
+    if name == "IdolCardSkin" and "name" in filtered_record:
+        desc_array = filtered_record["name"]
+        if isinstance(desc_array, list) and len(desc_array) == 1 and desc_array[0] == "":
+            filtered_record["name"] = []
+
+    return filtered_record
+
+
+def compile_path_checker(field_paths: list):
+    """
+    Compile field_paths into a trie-based checker returning the indices of the paths a record
+    does not have. A path is present when every key exists; for lists any dict item may hold the
+    rest of the path. Each record is walked once, and a list stops being scanned as soon as
+    every path below it has been found.
+    """
+    paths = [path_str.split(".") for path_str in field_paths]
+
+    def build(indices, depth):
+        groups = {}
+        for idx in indices:
+            groups.setdefault(paths[idx][depth], []).append(idx)
+
+        nodes = []
+        for key, group in groups.items():
+            deeper = [idx for idx in group if len(paths[idx]) > depth + 1]
+            child = build(deeper, depth + 1) if deeper else None
+            nodes.append((key, group, child, frozenset(deeper)))
+
+        def missing(obj: dict) -> set:
+            result = set()
+            for key, group, child, deeper in nodes:
+                if key not in obj:
+                    result.update(group)
+                    continue
+                if child is None:
+                    continue
+                sub_obj = obj[key]
+                if isinstance(sub_obj, dict):
+                    result |= child(sub_obj)
+                elif isinstance(sub_obj, list):
+                    remaining = deeper
+                    for item in sub_obj:
+                        if isinstance(item, dict):
+                            remaining = remaining & child(item)
+                            if not remaining:
+                                break
+                    result |= remaining
+                else:
+                    result |= deeper
+            return result
+        return missing
+
+    check = build(range(len(paths)), 0)
+    everything = set(range(len(paths)))
+
+    def missing_paths(record: dict) -> set:
+        if not isinstance(record, dict):
+            return set(everything)
+        return check(record)
+
+    return missing_paths
+
+
+class SuperKeyFinder:
+    """
+    Finds the first record having all field paths (the "super key object") while the records
+    are produced, and keeps enough state to explain why when there is none.
+    """
+    def __init__(self, field_paths: list):
+        self.field_paths = field_paths
+        self.missing_paths = compile_path_checker(field_paths)
+        self.index = None
+        self.never_present = set(range(len(field_paths)))
+        self.closest = None
+
+    def feed(self, idx: int, record: dict):
+        if self.index is not None:
+            return
+        missing = self.missing_paths(record)
+        if not missing:
+            self.index = idx
+            return
+        self.never_present &= missing
+        if self.closest is None or len(missing) < len(self.closest[1]):
+            self.closest = (idx, missing)
+
+    def report_missing(self, name: str):
+        if self.closest is None:
+            print(f"Failed to find super key object from {name}: no records")
+        elif self.never_present:
+            paths = ", ".join(self.field_paths[i] for i in sorted(self.never_present))
+            print(f"Failed to find super key object from {name}: no record has {paths}")
+        else:
+            idx, missing = self.closest
+            paths = ", ".join(self.field_paths[i] for i in sorted(missing))
+            print(f"Failed to find super key object from {name}: "
+                  f"every path exists in some record, closest record #{idx} is missing {paths}")
+
 
 def filter_record_fields(record: dict, field_paths: list,
                          primary_keys: list, other_keys: list) -> dict:
@@ -594,18 +756,411 @@ def transform_value_for_test_mode(value):
     return value
 
 
+def compile_field_paths(field_paths: list, other_keys: list):
+    """
+    Compile field_paths into an extractor equivalent to
+    filter_record_fields(record, field_paths, primary_keys, other_keys).
+    The paths are split once and grouped into a trie, so all of them are fetched from a record
+    in a single walk (e.g. every produceDescriptions.* path shares one pass over produceDescriptions).
+    The values are then merged in field_paths order, which keeps the key order of filter_record_fields.
+    """
+    paths = [path_str.split(".") for path_str in field_paths]
+    test_flags = [TestMode and path_str in other_keys for path_str in field_paths]
+    size = len(paths)
+
+    def build(indices, depth):
+        # Group paths by their key at this depth, in order of first appearance
+        groups = {}
+        for idx in indices:
+            groups.setdefault(paths[idx][depth], []).append(idx)
+
+        nodes = []
+        for key, group in groups.items():
+            leaf_idxs = tuple(idx for idx in group if len(paths[idx]) == depth + 1)
+            deeper = [idx for idx in group if len(paths[idx]) > depth + 1]
+            child = build(deeper, depth + 1) if deeper else None
+            nodes.append((key, leaf_idxs, child, tuple(deeper)))
+
+        def fetch(obj: dict, out: list):
+            # Same rules as get_nested_value, for every path under this trie level at once
+            for key, leaf_idxs, child, deeper in nodes:
+                if key not in obj:
+                    continue
+                sub_obj = obj[key]
+                for idx in leaf_idxs:
+                    out[idx] = sub_obj
+                if child is None:
+                    continue
+                if isinstance(sub_obj, dict):
+                    child(sub_obj, out)
+                elif isinstance(sub_obj, list):
+                    results = [[] for _ in deeper]
+                    item_out = [None] * size
+                    for item in sub_obj:
+                        if isinstance(item, dict):
+                            child(item, item_out)
+                        for result, idx in zip(results, deeper):
+                            result.append(item_out[idx])
+                            item_out[idx] = None
+                    for result, idx in zip(results, deeper):
+                        out[idx] = result
+        return fetch
+
+    def merge_path(target_dict: dict, path: list, depth: int, value):
+        # merge_nested_value(target_dict, path[depth:], value) without slicing the path
+        last = len(path) - 1
+        while depth < last:
+            key = path[depth]
+            if isinstance(value, list):
+                sub_list = target_dict.get(key)
+                if not isinstance(sub_list, list):
+                    sub_list = target_dict[key] = [None] * len(value)
+                for i, v in enumerate(value):
+                    if v is None:
+                        continue
+                    if sub_list[i] is None:
+                        sub_list[i] = {}
+                    if depth + 1 == last:
+                        sub_list[i][path[last]] = v
+                    else:
+                        merge_path(sub_list[i], path, depth + 1, v)
+                return
+            sub_dict = target_dict.get(key)
+            if not isinstance(sub_dict, dict):
+                sub_dict = target_dict[key] = {}
+            target_dict = sub_dict
+            depth += 1
+        target_dict[path[last]] = value
+
+    fetch_all = build(range(size), 0)
+    plan = list(zip(paths, test_flags, range(size)))
+
+    def extract(record: dict) -> dict:
+        new_record = {}
+        if not isinstance(record, dict):
+            return new_record
+        values = [None] * size
+        fetch_all(record, values)
+        for path, test_flag, idx in plan:
+            value = values[idx]
+            if value is None:
+                continue
+            if test_flag:
+                value = transform_value_for_test_mode(value)
+            if len(path) == 1:
+                new_record[path[0]] = value
+            else:
+                merge_path(new_record, path, 0, value)
+        return new_record
+
+    return extract
+
+
 # process_list = ["ProduceStepLesson", "SupportCardFlavor"]
 process_list = None
 
-def convert_yaml_types(folder_path="./gakumasu-diff/orig"):
+
+def convert_yaml_file(file_path: str, name: str, use_libyaml=True, stream=False):
+    """
+    Parse a single master YAML file and save it as json (record by record if stream is set).
+    Returns (output path, error message); runs in worker processes when --jobs > 1,
+    so errors are returned instead of raised.
+    """
+    try:
+        if stream:
+            return stream_json(file_path, name, use_libyaml), None
+        content = read_yaml_content(file_path)
+        data = load_yaml(content, use_libyaml)
+        return save_json(data, name), None
+    except Exception as e:
+        return None, str(e)
+
+
+class YamlLineReader:
     """
-    Iterates over all YAML files in a specified folder, loads their contents, and prints the type of each file.
+    File-like wrapper applying the read_yaml_content fixes line by line,
+    so a YAML file can be parsed without reading it into memory as a whole.
+    """
+    def __init__(self, f, hide_control=False):
+        self.f = f
+        self.name = getattr(f, "name", "<file>")
+        self.hide_control = hide_control
+        self.buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = self.f.readline()
+            if not line:
+                break
+            line = TAB_VALUE_PATTERN.sub(r': "\1"', line)
+            if line.endswith("|\n"):
+                line = line[:-1] + "+\n"
+            if self.hide_control:
+                line = hide_control_chars(line)
+            self.buffer += line
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+if FastLoader is not None:
+    class FastStreamLoader(FastLoader, Composer):
+        """
+        FastLoader that can compose one node at a time (CParser only offers whole documents)
+        """
+        def __init__(self, stream):
+            super().__init__(stream)
+            self.anchors = {}
+else:
+    FastStreamLoader = None
+
+
+class NotSequenceError(Exception):
+    pass
+
+
+def iter_yaml_records(f, use_libyaml=True):
+    """
+    Yield the items of a top-level YAML sequence one record at a time.
+    Raises NotSequenceError if the document is not a sequence.
+    """
+    use_fast = use_libyaml and FastStreamLoader is not None
+    loader_cls = FastStreamLoader if use_fast else CustomLoader
+    loader = loader_cls(YamlLineReader(f, hide_control=use_fast))
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStartEvent
+        if not loader.check_event(SequenceStartEvent):
+            raise NotSequenceError(getattr(f, "name", "<file>"))
+        loader.get_event()
+        while not loader.check_event(SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            yield loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+def stream_json(file_path: str, name: str, use_libyaml=True):
+    """
+    Streaming variant of load_yaml + save_json: records are parsed, filtered and written to
+    the output one at a time, so memory is bounded by the largest record rather than the table.
+    The record that save_json would move to the front is found while streaming; the records are
+    spooled to a temporary file and copied to the output in the final order.
+    Falls back to the whole-file path for documents that are not a top-level sequence.
+    """
+    rule = primary_key_rules.get(name)
+    if not rule or len(rule) < 2:
+        return None
+
+    primary_keys = rule[0]
+    other_keys = rule[1]
+    all_keys = primary_keys + other_keys
+    extract = compile_field_paths(all_keys, other_keys)
+
+    fmt = json_format.get_format()
+    offsets = [0]
+    finder = SuperKeyFinder(all_keys)
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f, tempfile.TemporaryFile() as spool:
+            for record in iter_yaml_records(f, use_libyaml):
+                filtered_record = filter_table_record(record, name, extract)
+                finder.feed(len(offsets) - 1, filtered_record)
+                text = json_format.dumps(filtered_record, indent=4, fmt=fmt)
+                if fmt == "pretty":
+                    # Indent on "\n" only: strings keep U+2028, U+2029 and U+0085 unescaped,
+                    # which textwrap.indent (str.splitlines) would treat as line breaks
+                    text = " " * 8 + text.replace("\n", "\n" + " " * 8)
+                spool.write(text.encode("utf-8"))
+                offsets.append(spool.tell())
+
+            if len(offsets) == 1:
+                return None
+            if finder.index is None:
+                finder.report_missing(name)
+            order = list(range(len(offsets) - 1))
+            if finder.index:
+                order.insert(0, order.pop(finder.index))
+
+            # The same text as save_json, written around the spooled records
+            if fmt == "pretty":
+                header = json.dumps({"rules": {"primaryKeys": primary_keys}}, ensure_ascii=False, indent=4)
+                prefix, separator, suffix = header[:-2] + ',\n    "data": [\n', ",\n", "\n    ]\n}"
+            else:
+                rules = json_format.dumps({"primaryKeys": primary_keys}, fmt=fmt)
+                if fmt == "minified":  # sorted keys: "data" comes before "rules"
+                    prefix, separator, suffix = '{"data":[', ",", '],"rules":' + rules + "}"
+                else:
+                    prefix, separator, suffix = '{"rules":' + rules + ',"data":[', ",", "]}"
+            os.makedirs('./gakumasu-diff/json', exist_ok=True)
+            with open(f'gakumasu-diff/json/{name}.json', 'w', encoding='utf-8') as out:
+                out.write(prefix)
+                for n, idx in enumerate(order):
+                    if n:
+                        out.write(separator)
+                    spool.seek(offsets[idx])
+                    out.write(spool.read(offsets[idx + 1] - offsets[idx]).decode("utf-8"))
+                out.write(suffix)
+    except NotSequenceError:
+        return save_json(load_yaml(read_yaml_content(file_path), use_libyaml), name)
+    return f'gakumasu-diff/json/{name}.json'
+
+
+# Character table with the line separators json.dumps leaves unescaped (YAML \L, \P and \N)
+STREAM_PARITY_SAMPLE = (
+    '- id: stream-parity\n'
+    '  lastName: "x\\L y"\n'
+    '  firstName: "a\\P b\\N c"\n'
+    '  alphabetLastName: "line\\nbreak"\n'
+    '  alphabetFirstName: "z"\n'
+)
+
+
+def check_stream_parity(folder_path="./gakumasu-diff/orig", use_libyaml=True):
+    """
+    Convert STREAM_PARITY_SAMPLE and every YAML file of folder_path with both save_json and
+    stream_json (in a temporary folder, the current json is left alone) and compare the outputs.
+    Returns the list of files whose outputs differ.
+    """
+    sources = []
+    for root, _, files in os.walk(folder_path):
+        for file in sorted(files):
+            if file.endswith('.yaml'):
+                sources.append((os.path.abspath(os.path.join(root, file)), file[:-5]))
+
+    mismatched = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = os.path.join(tmp_dir, "Character.yaml")
+        with open(sample_path, 'w', encoding='utf-8') as f:
+            f.write(STREAM_PARITY_SAMPLE)
+        os.chdir(tmp_dir)
+        try:
+            for file_path, name in [(sample_path, "Character")] + sources:
+                outputs = []
+                for convert in (lambda: save_json(load_yaml(read_yaml_content(file_path), use_libyaml), name),
+                                lambda: stream_json(file_path, name, use_libyaml)):
+                    output = convert()
+                    if output is None:
+                        outputs.append(None)
+                        continue
+                    with open(output, 'rb') as f:
+                        outputs.append(f.read())
+                    os.remove(output)
+                if outputs[0] != outputs[1]:
+                    print(f"Stream mismatch: {file_path}")
+                    mismatched.append(file_path)
+        finally:
+            os.chdir(cwd)
+
+    print(f"Stream parity: {len(mismatched)} mismatched file(s)")
+    return mismatched
+
+
+MANIFEST_PATH = "gakumasu-diff/json/.manifest"
+REVISION_PATH = "gakumasu-diff/json/.revision"
+
+
+def rules_hash(name: str) -> str:
+    """
+    Hash of everything besides the YAML content that decides the json output of a table.
+    """
+    rule = primary_key_rules.get(name)
+    inputs = [rule, TestMode]
+    if json_format.get_format() != "pretty":  # keeps the hashes of existing manifests valid
+        inputs.append(json_format.get_format())
+    return hashlib.sha256(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH) -> dict:
+    """
+    Load the {yaml file: {"content", "rules", "output"}} manifest of the last conversion.
+    """
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(manifest: dict, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def git_revision(folder_path: str):
+    """
+    Return the HEAD commit of the git checkout at folder_path, or None if it is not one.
+    """
+    try:
+        result = subprocess.run(["git", "-C", folder_path, "rev-parse", "HEAD"],
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def git_changed_yaml(folder_path: str, since: str):
+    """
+    Return the set of *.yaml paths (relative to folder_path) that were added or modified
+    between the since revision and HEAD, or None if git cannot answer.
+    """
+    try:
+        result = subprocess.run(["git", "-C", folder_path, "diff", "--name-only", "--relative",
+                                 "--no-renames", "--diff-filter=d", "-z", since, "HEAD", "--", "*.yaml"],
+                                capture_output=True, text=True, encoding="utf-8", check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Failed to get changed files since {since}: {getattr(e, 'stderr', '') or e}")
+        return None
+    return {path for path in result.stdout.split("\0") if path}
+
+
+def load_revision(path=REVISION_PATH):
+    """
+    Load the gakumasu-diff revision of the last successful conversion.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip() or None
+
+
+def save_revision(revision: str, path=REVISION_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(revision + "\n")
+
+
+def convert_yaml_types(folder_path="./gakumasu-diff/orig", jobs=1, use_libyaml=True, force=False,
+                       changed_files=None, stream=False):
+    """
+    Iterates over all YAML files in a specified folder, loads their contents and saves them as json.
     Automatically replaces tabs in YAML files with spaces.
+    Files whose content and rule are unchanged since the last run (see MANIFEST_PATH) are skipped
+    unless force is set.
+    changed_files (paths relative to folder_path, see git_changed_yaml) limits the run to those files
+    and files whose rule changed, without reading the others.
+    With jobs > 1 the files are converted in a process pool; progress is still reported in walk order.
+    Returns a list of (file_path, error) for the files that failed.
     """
     if not os.path.isdir(folder_path):
         print(f"The path '{folder_path}' is not a valid folder.")
-        return
+        return []
+
+    manifest = {} if force else load_manifest()
+    new_manifest = {}
+    skipped = 0
 
+    tasks = []
     for root, _, files in os.walk(folder_path):
         total = len(files)
         for n, file in enumerate(files):
@@ -618,24 +1173,118 @@ def convert_yaml_types(folder_path="./gakumasu-diff/orig"):
                 # print(f"\"{file[:-5]}\": [[], []],")
                 # continue
 
+                manifest_key = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+                old_entry = manifest.get(manifest_key)
+                if (changed_files is not None and manifest_key not in changed_files
+                        and old_entry and old_entry["rules"] == rules_hash(file[:-5])):
+                    skipped += 1
+                    continue
+
+                with open(file_path, 'rb') as f:
+                    content_hash = hashlib.sha256(f.read()).hexdigest()
+                entry = {"content": content_hash, "rules": rules_hash(file[:-5])}
+
+                if (old_entry and old_entry["content"] == entry["content"]
+                        and old_entry["rules"] == entry["rules"]
+                        and (old_entry["output"] is None or os.path.isfile(old_entry["output"]))):
+                    new_manifest[manifest_key] = old_entry
+                    skipped += 1
+                    continue
+
+                tasks.append((file_path, file[:-5], n, total, manifest_key, entry))
+
+    # Keep entries of files outside this run (e.g. filtered out by process_list)
+    for key, entry in manifest.items():
+        new_manifest.setdefault(key, entry)
+
+    errors = []
+
+    def report(task, output, error):
+        if error is not None:
+            print(f"Error occured while loading file {task[0]}: {error}")
+            errors.append((task[0], error))
+            new_manifest.pop(task[4], None)
+        else:
+            new_manifest[task[4]] = {**task[5], "output": output}
+
+    if jobs <= 1:
+        for task in tasks:
+            file_path, name, n, total = task[:4]
+            print("Parsing", file_path, f"to json. ({n}/{total})")
+            output, error = convert_yaml_file(file_path, name, use_libyaml, stream)
+            report(task, output, error)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(convert_yaml_file,
+                                   [t[0] for t in tasks], [t[1] for t in tasks],
+                                   [use_libyaml] * len(tasks), [stream] * len(tasks))
+            for task, (output, error) in zip(tasks, results):
+                file_path, name, n, total = task[:4]
                 print("Parsing", file_path, f"to json. ({n}/{total})")
-                try:
-                    # Preprocess file: replace tabs with 4 spaces
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    content = re.sub(r': (\t.*)', r': "\1"', content)  # Replace tab characters
-                    content = content.replace("|\n", "|+\n") # Fix literal strings newline chomping
+                report(task, output, error)
+
+    save_manifest(new_manifest)
+
+    if skipped:
+        print(f"Skipped {skipped} unchanged file(s), use --force to rebuild them.")
+    if errors:
+        print(f"{len(errors)} file(s) failed to convert:")
+        for file_path, error in errors:
+            print(f"  {file_path}: {error}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', nargs='?', default="./gakumasu-diff/orig")
+    add_jobs_argument(parser)
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild every file, ignoring the manifest of the last run")
+    parser.add_argument('--since', nargs='?', const="last", metavar="REV",
+                        help="Only convert YAML files changed in git since REV "
+                             "(default: the revision of the last conversion)")
+    parser.add_argument('--no-libyaml', action='store_true',
+                        help="Always use the pure python loader")
+    parser.add_argument('--stream', action='store_true',
+                        help="Convert record by record to bound memory use on large tables")
+    parser.add_argument('--check-loader', action='store_true',
+                        help="Compare the libyaml and pure python loaders on every file and exit")
+    parser.add_argument('--check-stream', action='store_true',
+                        help="Compare --stream with the whole-file conversion on every file and exit")
+    json_format.add_format_argument(parser)
+    args = parser.parse_args()
+    json_format.apply_format_argument(args)
+
+    if args.check_loader:
+        if check_loader_parity(args.folder):
+            sys.exit(1)
+        return
+    if args.check_stream:
+        if check_stream_parity(args.folder, use_libyaml=not args.no_libyaml):
+            sys.exit(1)
+        return
+
+    changed_files = None
+    if args.since and not args.force:
+        since = load_revision() if args.since == "last" else args.since
+        if since is None:
+            print("No previously converted revision recorded, converting everything.")
+        else:
+            changed_files = git_changed_yaml(args.folder, since)
+            if changed_files is not None:
+                print(f"{len(changed_files)} YAML file(s) changed since {since}")
 
-                    # Parsing YAML content
-                    # data = yaml.safe_load(content)
-                    data = yaml.load(content, CustomLoader)
-                    save_json(data, file[:-5])
+    jobs = resolve_jobs(args.jobs)
+    errors = convert_yaml_types(args.folder, jobs=jobs, use_libyaml=not args.no_libyaml,
+                                force=args.force, changed_files=changed_files, stream=args.stream)
+    if errors:
+        sys.exit(1)
 
-                    # print(f"文件: {file_path}")
-                    # print(f"类型: {type(data)}\n")
-                except Exception as e:
-                    print(f"Error occured while loading file {file_path}: {e}")
+    # Only record the revision once everything up to it converted cleanly
+    revision = git_revision(args.folder)
+    if revision:
+        save_revision(revision)
 
 
 if __name__ == '__main__':
-    convert_yaml_types()
+    main()
@@ -1,6 +1,12 @@
-import json
+import argparse
 import os
 import sys
+from functools import partial
+
+import json_format
+from job_pool import add_jobs_argument, resolve_jobs, run_jobs
+from record_walker import find_leaf, index_records, parse_path, split_full_key, walk_record
+from translation_memory import DEFAULT_TM_PATH, TranslationMemory, table_name
 
 # Special rules for handling special cases of certain fields
 # Format: {"filename": {"field name": {"rule"} }}
@@ -28,6 +34,30 @@ special_rules = {
 }
 
 
+def apply_translation(v, trans_data, setter, filename=None):
+    """
+    Replace the text leaf v (a string or a string array) through setter(new_value).
+    String arrays are translated from their "[LA_F]...[LA_N_F]..." form.
+    """
+    if isinstance(v, str):
+        setter(trans_data)
+    elif trans_data.startswith("[LA_F]"):
+        remaining = trans_data[len("[LA_F]"):]
+        if remaining == "":
+            setter([])
+        else:
+            list_data = remaining.split("[LA_N_F]")
+            k = setter.args[0]  # field name
+            if filename in special_rules and k in special_rules[filename]:
+                rule = special_rules[filename][k]
+                if "is_empty" in rule and len(list_data) == 1 and list_data[0] == "":
+                    setter([])
+                else:
+                    setter(list_data)
+            else:
+                setter(list_data)
+
+
 def fill_back_translations(data_obj, primary_keys, trans_map, filename=None):
     """
     data_obj is a record of the original localized data;
@@ -35,116 +65,158 @@ def fill_back_translations(data_obj, primary_keys, trans_map, filename=None):
     Match based on baseKey (composed of primary key) + path, and fill the translation back into data_obj.
     """
 
-    # Get baseKey first
-    pk_parts = []
-    for pk in primary_keys:
-        if "." not in pk:
-            val = data_obj.get(pk, "")
-            pk_parts.append(str(val))
-        else:
-            top_level, sub_field = pk.split(".", 1)
-            top_val = data_obj.get(top_level, None)
-            if isinstance(top_val, list) and len(top_val) > 0 and isinstance(top_val[0], dict):
-                sub_val = top_val[0].get(sub_field, "")
-                pk_parts.append(str(sub_val))
-            elif isinstance(top_val, dict):
-                sub_val = top_val.get(sub_field, "")
-                pk_parts.append(str(sub_val))
-            else:
-                pk_parts.append("")
-    baseKey = "|".join(pk_parts)
-
     # Traverse data_obj, if key= base Key|xxx is found, replace its content
-    def traverse(obj, prefix=""):
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                new_prefix = prefix + "." + k if prefix else k
-                if isinstance(v, str):
-                    fullKey = baseKey + "|" + new_prefix
-                    if fullKey in trans_map:
-                        obj[k] = trans_map[fullKey]
-                elif isinstance(v, list):
-                    fullKey = baseKey + "|" + new_prefix
-                    if fullKey in trans_map:
-                        trans_data = trans_map[fullKey]
-                        if trans_data.startswith("[LA_F]"):
-                            remaining = trans_data[len("[LA_F]"):]
-                            if remaining == "":
-                                obj[k] = []
-                            else:
-                                list_data = remaining.split("[LA_N_F]")
-                                if filename in special_rules and k in special_rules[filename]:
-                                    rule = special_rules[filename][k]
-                                    if "is_empty" in rule and len(list_data) == 1 and list_data[0] == "":
-                                        obj[k] = []
-                                    else:
-                                        obj[k] = list_data
-                                else:
-                                    obj[k] = list_data
-                        else:
-                            traverse(v, new_prefix)
-                    else:
-                        traverse(v, new_prefix)
-                elif isinstance(v, dict):
-                    traverse(v, new_prefix)
-        elif isinstance(obj, list):
-            for idx, item in enumerate(obj):
-                new_prefix = prefix + f"[{idx}]"
-                if isinstance(item, dict) or isinstance(item, list):
-                    traverse(item, new_prefix)
-
-    traverse(data_obj)
+    for fullKey, v, setter in walk_record(data_obj, primary_keys):
+        if fullKey in trans_map:
+            apply_translation(v, trans_map[fullKey], setter, filename)
 
 
-def import_main(base_json, translated_json, output_json):
+def fill_translations(records, primary_keys, trans_map, filename=None):
+    """
+    Same result as fill_back_translations on every record, driven by trans_map instead:
+    the fullKeys are split into baseKey and path, and only those paths are resolved on the records
+    with that baseKey. The cost follows the number of translations, not the size of the table.
+    """
+    index = index_records(records, primary_keys)
+    for fullKey, trans_data in trans_map.items():
+        base_key, raw = split_full_key(fullKey)
+        matching = index.get(base_key)
+        if not matching:
+            continue
+        path = parse_path(raw)
+        for record in matching:
+            leaf = find_leaf(record, path)
+            if leaf is not None:
+                obj, k = leaf
+                apply_translation(obj[k], trans_data, partial(obj.__setitem__, k), filename)
+
+
+class TranslationImportError(Exception):
+    pass
+
+
+def import_translations(base_json, translated_json, output_json) -> dict:
+    """
+    Fill the key:en map of translated_json into the base json and write the result to output_json.
+    Returns the translation map; raises TranslationImportError if an input is missing or does not
+    have the expected structure.
+    """
     if not os.path.isfile(base_json):
-        print(f"Cannot find base file: {base_json}")
-        sys.exit(1)
+        raise TranslationImportError(f"Cannot find base file: {base_json}")
     if not os.path.isfile(translated_json):
-        print(f"Cannot find translation file: {translated_json}")
-        sys.exit(1)
+        raise TranslationImportError(f"Cannot find translation file: {translated_json}")
 
     with open(base_json, "r", encoding="utf-8") as f1:
-        root = json.load(f1)
+        try:
+            root = json_format.load(f1)
+        except ValueError as e:
+            raise TranslationImportError(f"Invalid json {base_json}: {e}")
 
     with open(translated_json, "r", encoding="utf-8") as f2:
-        trans_map = json.load(f2)  # {"key": "translated text", ...}
+        try:
+            trans_map = json_format.load(f2)  # {"key": "translated text", ...}
+        except ValueError as e:
+            raise TranslationImportError(f"Invalid json {translated_json}: {e}")
 
     if "rules" not in root or "primaryKeys" not in root["rules"]:
-        print("Missing rules.primaryKeys, does your json have proper structure?")
-        sys.exit(1)
+        raise TranslationImportError("Missing rules.primaryKeys, does your json have proper structure?")
 
     primary_keys = root["rules"]["primaryKeys"]
     if "data" not in root or not isinstance(root["data"], list):
-        print("The data array is missing ,does your json have proper structure?")
-        sys.exit(1)
+        raise TranslationImportError("The data array is missing ,does your json have proper structure?")
+
+    # Fill in the translations on the records they belong to
+    fill_translations(root["data"], primary_keys, trans_map)
+
+    # Write new json through a temp file, so an interrupted import never leaves a half-written file
+    tmp_json = output_json + ".tmp"
+    with open(tmp_json, "w", encoding="utf-8") as out:
+        json_format.dump(root, out, indent=2)
+    os.replace(tmp_json, output_json)
+    return trans_map
 
-    # Traverse the data array and fill in the translations one by one
-    for row in root["data"]:
-        fill_back_translations(row, primary_keys, trans_map)
 
-    # Write new json
-    with open(output_json, "w", encoding="utf-8") as out:
-        json.dump(root, out, ensure_ascii=False, indent=2)
+def import_main(base_json, translated_json, output_json):
+    try:
+        trans_map = import_translations(base_json, translated_json, output_json)
+    except TranslationImportError as e:
+        print(e)
+        sys.exit(1)
 
     print(f"Merge completed: {output_json}")
+    return trans_map
+
+
+def import_file(base_json, translated_json, output_json) -> dict:
+    """
+    Import a single file; used by the (parallel) directory import. Returns {"entries"}.
+    """
+    return {"entries": len(import_translations(base_json, translated_json, output_json))}
+
+
+def import_files(tasks: list, jobs=1):
+    """
+    Run import_file for every (base json, translated json, output json) of tasks, in a process
+    pool when jobs > 1. The results {"base", "translated", "output", "entries", "seconds", "error"}
+    are yielded and reported in the order of tasks; a failing file does not stop the others.
+    """
+    results = run_jobs(import_file, tasks, jobs, errors=(TranslationImportError, OSError),
+                       result=lambda b, t, o: {"base": b, "translated": t, "output": o, "entries": 0})
+    for result in results:
+        if result["error"]:
+            print(f"Import failed: {result['translated']}: {result['error']}")
+        else:
+            print(f"Merge completed: {result['output']} (total {result['entries']} entries, "
+                  f"{result['seconds']:.2f}s)")
+        yield result
 
 
-def main(base_dir, translated_dir, output_dir="merged"):
+def main(base_dir, translated_dir, output_dir="merged", tm=None, jobs=1) -> list:
+    """
+    Import every key:en file of translated_dir into the base json of base_dir.
+    If tm (a TranslationMemory) is given, the imported translations are recorded in it.
+    A failing file does not stop the others; the per-file results are returned in walk order.
+    """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    tasks = []
     for root, dirs, files in os.walk(translated_dir):
         for file in files:
             if file.endswith(".json"):
-                translated_json = os.path.join(root, file)
-                base_json = os.path.join(base_dir, file)
-                output_json = os.path.join(output_dir, file)
-                import_main(base_json, translated_json, output_json)
+                tasks.append((os.path.join(base_dir, file), os.path.join(root, file), os.path.join(output_dir, file)))
+
+    results = []
+    for result in import_files(tasks, jobs):
+        if tm is not None and not result["error"]:
+            with open(result["translated"], "r", encoding="utf-8") as f:
+                tm.set_translations(table_name(os.path.basename(result["translated"])), json_format.load(f))
+        results.append(result)
+    return results
 
 
 if __name__ == "__main__":
-    main(
-        base_dir=sys.argv[1] if len(sys.argv) > 1  else "gakumasu-diff/json",
-        translated_dir=sys.argv[2] if len(sys.argv) > 2 else "pretranslate_todo/translated_out"
-    )
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir', nargs='?', default="gakumasu-diff/json")
+    parser.add_argument('translated_dir', nargs='?', default="pretranslate_todo/translated_out")
+    add_jobs_argument(parser)
+    parser.add_argument('--tm', nargs='?', const=DEFAULT_TM_PATH, metavar="PATH",
+                        help="Record the imported translations in the translation memory")
+    json_format.add_format_argument(parser)
+    args = parser.parse_args()
+    json_format.apply_format_argument(args)
+    jobs = resolve_jobs(args.jobs)
+
+    if args.tm:
+        with TranslationMemory(args.tm) as translation_memory:
+            results = main(args.base_dir, args.translated_dir, tm=translation_memory, jobs=jobs)
+    else:
+        results = main(args.base_dir, args.translated_dir, jobs=jobs)
+
+    failed = [r for r in results if r["error"]]
+    print(f"Imported {len(results) - len(failed)}/{len(results)} files, "
+          f"{sum(r['entries'] for r in results)} entries")
+    if failed:
+        for result in failed:
+            print(f"  {result['translated']}: {result['error']}")
+        sys.exit(1)
@@ -0,0 +1,70 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def add_jobs_argument(parser):
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Number of worker processes (0 = one per CPU)")
+
+
+def resolve_jobs(jobs: int) -> int:
+    """
+    The number of worker processes of a --jobs value; 0 (or less) means one per CPU.
+    """
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def call_job(func, args, errors):
+    """
+    Run func(*args) and return (fields, error, seconds). Any exception becomes the error message,
+    so one malformed file does not abort the other files of a batch: the types in errors are
+    reported with their message, anything else also with its type name.
+    """
+    start = time.perf_counter()
+    try:
+        fields, error = func(*args), None
+    except errors as e:
+        fields, error = {}, str(e)
+    except Exception as e:
+        fields, error = {}, f"{type(e).__name__}: {e}"
+    return fields, error, time.perf_counter() - start
+
+
+def run_jobs(func, items, jobs=1, result=None, errors=()):
+    """
+    Yield func(*item) for every argument tuple of items, in the order of items.
+    With jobs > 1 the calls run in a process pool (func and the arguments must then be picklable),
+    which is shut down once the results are consumed or the caller stops early.
+
+    Without result, exceptions of func are raised here. With result, a function building the
+    result dict of an item (e.g. its input and output paths and zero counts), func returns the
+    fields it computed and the yielded results are result(*item) updated with them, plus
+    "seconds" and "error" (None, or the message of the exception func raised, see call_job).
+    """
+    items = list(items)
+    if result is None:
+        calls, args = func, items
+    else:
+        calls, args = call_job, [(func, item, errors) for item in items]
+
+    if jobs <= 1 or not items:
+        outputs = (calls(*arg) for arg in args)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        outputs = executor.map(calls, *zip(*args))
+    try:
+        for item, output in zip(items, outputs):
+            if result is None:
+                yield output
+                continue
+            fields, error, seconds = output
+            item_result = result(*item)
+            item_result.update(fields)
+            item_result["seconds"] = seconds
+            item_result["error"] = error
+            yield item_result
+    finally:
+        if executor is not None:
+            executor.shutdown()
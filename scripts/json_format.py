@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import re
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The output format is shared by every script (and their worker processes) through the environment
+FORMAT_ENV = "GAKUMAS_JSON_FORMAT"
+FORMATS = ("pretty", "compact", "minified")
+# "json" forces the standard library even when orjson is installed
+BACKEND_ENV = "GAKUMAS_JSON_BACKEND"
+
+# Where orjson can write a float in exponent notation ("1e16"), candidates are checked for a digit before
+EXPONENT_CANDIDATE = re.compile(rb"[eE][-+0-9]")
+
+
+def get_format() -> str:
+    """
+    The json output format: "pretty" (indented, the default), "compact" (no whitespace)
+    or "minified" (no whitespace, keys sorted so the output does not depend on insertion order).
+    """
+    fmt = os.environ.get(FORMAT_ENV) or "pretty"
+    if fmt not in FORMATS:
+        raise ValueError(f"{FORMAT_ENV}={fmt} is not one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def set_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown json format {fmt}, expected one of {', '.join(FORMATS)}")
+    os.environ[FORMAT_ENV] = fmt
+
+
+def get_backend() -> str:
+    """
+    "orjson" if it is installed and not disabled through GAKUMAS_JSON_BACKEND=json, else "json".
+    """
+    if orjson is None or os.environ.get(BACKEND_ENV) == "json":
+        return "json"
+    return "orjson"
+
+
+def dump_options(indent=4, fmt=None) -> dict:
+    """
+    json.dump keyword arguments of a format; indent is the one the writer uses in pretty mode.
+    """
+    fmt = fmt or get_format()
+    if fmt == "pretty":
+        return {"ensure_ascii": False, "indent": indent}
+    if fmt == "compact":
+        return {"ensure_ascii": False, "separators": (",", ":")}
+    return {"ensure_ascii": False, "separators": (",", ":"), "sort_keys": True}
+
+
+def orjson_differs(data: bytes) -> bool:
+    """
+    Whether orjson output may differ from json.dumps: floats in exponent notation or below 1e-4
+    (json.dumps: 1e+16, 1e-05) and NaN / Infinity, which orjson writes as null.
+    Strings that merely look like it only cost a fallback to json.dumps.
+    """
+    if b"null" in data or b"0.0000" in data:
+        return True
+    for match in EXPONENT_CANDIDATE.finditer(data):
+        if data[match.start() - 1:match.start()].isdigit():
+            return True
+    return False
+
+
+def orjson_dumps(obj, indent=4, fmt=None):
+    """
+    orjson output identical to dumps(obj, indent, fmt), or None where orjson cannot produce it
+    (pretty with an indent other than 2, non-str keys, integers beyond 64 bit, lone surrogates, ...).
+    """
+    fmt = fmt or get_format()
+    if fmt == "pretty":
+        if indent != 2:
+            return None
+        option = orjson.OPT_INDENT_2
+    else:
+        option = orjson.OPT_SORT_KEYS if fmt == "minified" else 0
+    try:
+        data = orjson.dumps(obj, option=option)
+    except orjson.JSONEncodeError:
+        return None
+    if orjson_differs(data):
+        return None
+    return data.decode("utf-8")
+
+
+def dumps(obj, indent=4, fmt=None) -> str:
+    """
+    json.dumps(obj, ensure_ascii=False, ...) in the given (or current) format.
+    Uses orjson when it is available and gives the same text.
+    """
+    if get_backend() == "orjson":
+        text = orjson_dumps(obj, indent, fmt)
+        if text is not None:
+            return text
+    return json.dumps(obj, **dump_options(indent, fmt))
+
+
+def dump(obj, f, indent=4, fmt=None):
+    # json.dump always uses the pure python encoder, json.dumps the C one when there is no indent
+    f.write(dumps(obj, indent, fmt))
+
+
+def loads(s):
+    """
+    json.loads with orjson when it is available; anything orjson rejects (NaN, integers beyond
+    64 bit, lone surrogates, invalid json) is left to json.loads, including its errors.
+    """
+    if get_backend() == "orjson":
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(s)
+
+
+def load(f):
+    return loads(f.read())
+
+
+def add_format_argument(parser):
+    parser.add_argument('--format', choices=FORMATS,
+                        help=f"json output format (default: ${FORMAT_ENV} or pretty); "
+                             "compact/minified are smaller and faster to write, pretty is for diffs")
+
+
+def apply_format_argument(args):
+    """
+    Make the --format of parsed args the format of this process and of the processes it starts.
+    """
+    if args.format:
+        set_format(args.format)
+
+
+def check_backend_parity(json_dirs) -> int:
+    """
+    Load and write every json file of json_dirs with orjson and with the standard library in
+    every format and compare the results. Returns the number of differences.
+    """
+    if orjson is None:
+        print("orjson is not installed, the standard library is always used")
+        return 0
+
+    differences = files = fallbacks = 0
+    for json_dir in json_dirs:
+        for root, dirs, names in os.walk(json_dir):
+            for name in sorted(names):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                files += 1
+                obj = json.loads(text)
+                if json.dumps(orjson.loads(text), ensure_ascii=False) != json.dumps(obj, ensure_ascii=False):
+                    print(f"{path}: orjson loads a different object")
+                    differences += 1
+                for fmt, indent in (("pretty", 2), ("pretty", 4), ("compact", 4), ("minified", 4)):
+                    fast = orjson_dumps(obj, indent, fmt)
+                    if fast is None:
+                        fallbacks += fmt != "pretty" or indent == 2
+                    elif fast != json.dumps(obj, **dump_options(indent, fmt)):
+                        print(f"{path}: {fmt} (indent {indent}) output differs")
+                        differences += 1
+    print(f"Checked {files} files: {differences} differences, {fallbacks} outputs left to the standard library")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="json backend (orjson / standard library) tools")
+    parser.add_argument('command', choices=['check', 'backend'])
+    parser.add_argument('json_dirs', nargs='*', default=["data", "gakumasu-diff/json"])
+    args = parser.parse_args()
+
+    if args.command == 'backend':
+        print(get_backend())
+    elif check_backend_parity(args.json_dirs):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
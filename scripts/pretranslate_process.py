@@ -1,12 +1,18 @@
 import os
 import json
+import hashlib
 import shutil
 import argparse
 import sys
 
 import import_db_json
+import json_format
+from job_pool import resolve_jobs, run_jobs
 import export_db_json
 from csv_json_bridge import write_json, write_csv
+from source_index import load_source_index, record_sources, save_source_index, stale_keys, write_stale_report
+from template_match import TemplateIndex
+from translation_memory import DEFAULT_TM_PATH, TranslationMemory, table_name
 
 def values_to_keys(root_dir, output_type='json'):
     output_dir = "./pretranslate_todo/full_out"
@@ -19,7 +25,7 @@ def values_to_keys(root_dir, output_type='json'):
                 continue
             data = {}
             with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
-                orig_data = json.load(f)
+                orig_data = json_format.load(f)
 
             for _, v in orig_data.items():
                 data[v] = ""
@@ -35,138 +41,554 @@ def values_to_keys(root_dir, output_type='json'):
             print("Extracted file", name[:-4]+output_type)
 
 
-def pretranslated_to_kv_files(
-        root_dir: str,
-        translated_dir: str,
-        save_dir="pretranslate_todo/translated_out"
+def export_todo_file(input_json, output_file, output_type='json') -> dict:
+    """
+    Write the jp: "" file of one master data table (gakumasu-diff/json) without an exports/ key:jp file.
+    Every text is written once, in the order values_to_keys would write it. Returns {"rows"}.
+    """
+    key_map = export_db_json.export_translatable_text(input_json)
+    data = dict.fromkeys(key_map.values(), "")
+    if output_type == 'json':
+        write_json(output_file, data)
+    else:
+        write_csv(output_file, data)
+    return {"rows": len(data)}
+
+
+def master_to_todo_files(json_dir="gakumasu-diff/json", output_type='json', jobs=1) -> list:
+    """
+    One-pass replacement of export_db_json + values_to_keys: read every master data table once
+    and write its jp: "" file (json or csv) into pretranslate_todo/full_out, in a process pool when jobs > 1.
+    """
+    output_dir = "./pretranslate_todo/full_out"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    inputs, outputs = [], []
+    for root, dirs, files in os.walk(json_dir):
+        for name in files:
+            if name.endswith(".json"):
+                inputs.append(os.path.join(root, name))
+                outputs.append(os.path.join(output_dir, name[:-4] + output_type))
+
+    collected = []
+    results = run_jobs(export_todo_file, [(i, o, output_type) for i, o in zip(inputs, outputs)], jobs,
+                       errors=(export_db_json.ExportError, OSError),
+                       result=lambda i, o, output_type: {"input": i, "output": o, "rows": 0})
+    for result in results:
+        if result["error"]:
+            print(f"Export failed: {result['input']}: {result['error']}")
+        else:
+            print("Extracted file", os.path.basename(result["output"]), f"({result['rows']} texts)")
+        collected.append(result)
+    return collected
+
+
+UNIQUE_OUT_DIR = "./pretranslate_todo/unique_out"
+
+
+def build_dedup_index(root_dir) -> dict:
+    """
+    Map every unique text of the key:jp files in root_dir to all of its occurrences:
+    { jp: [[table, fullKey], ...] }, in order of first appearance.
+    """
+    index = {}
+    for root, dirs, files in os.walk(root_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                orig_data = json_format.load(f)
+            table = table_name(name)
+            for k, v in orig_data.items():
+                index.setdefault(v, []).append([table, k])
+    return index
+
+
+def values_to_unique(root_dir, output_type='json', output_dir=UNIQUE_OUT_DIR):
+    """
+    Like values_to_keys, but write a single jp: "" file with every text only once
+    (unique.json / unique.csv) plus the occurrence index (unique_index.json) used by unique_to_kv_files.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    index = build_dedup_index(root_dir)
+    data = {v: "" for v in index}
+
+    with open(os.path.join(output_dir, "unique_index.json"), 'w', encoding='utf-8') as f:
+        json_format.dump(index, f, indent=4)
+
+    output_file = os.path.join(output_dir, "unique.json")
+    if output_type == 'json':
+        write_json(output_file, data)
+    elif output_type == 'csv':
+        write_csv(output_file.replace('.json', '.csv'), data)
+
+    total = sum(len(occurrences) for occurrences in index.values())
+    per_table = sum(len({table for table, _ in occurrences}) for occurrences in index.values())
+    print(f"Extracted {len(index)} unique texts ({total} keys, {per_table} entries in per-table files) "
+          f"into {output_dir}")
+
+
+def unique_to_kv_files(
+        unique_dir=UNIQUE_OUT_DIR,
+        save_dir="pretranslate_todo/translated_out",
+        root_dir="exports",
+        jobs=1
 ):
+    """
+    Fan the translations of unique_translated.json (jp:en) back out to a key:en file per table
+    using unique_index.json. Untranslated texts keep the Japanese text, like pretranslated_to_kv_files.
+    The keys of a table are written in the order of its key:jp file in root_dir (the order
+    pretranslated_to_kv_files writes them in); without that file, in the order of the index.
+    """
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
-    for root, dirs, files in os.walk(translated_dir):
-        for name in files:
-            if not name.endswith("_translated.json"):
-                continue
-            translated_file = os.path.join(root, name)
-            orig_file = os.path.join(root_dir, name[:-16] + ".json")
-            save_file = os.path.join(save_dir, name[:-16] + ".json")
+    with open(os.path.join(unique_dir, "unique_index.json"), 'r', encoding='utf-8') as f:
+        index = json_format.load(f)
+    with open(os.path.join(unique_dir, "unique_translated.json"), 'r', encoding='utf-8') as f:
+        translated_data = json_format.load(f)
+
+    tables = {}
+    for orig_jp, occurrences in index.items():
+        en = translated_data.get(orig_jp, orig_jp)
+        for table, k in occurrences:
+            tables.setdefault(table, {})[k] = en
+
+    outputs = []
+    for table, data in tables.items():
+        key_file = os.path.join(root_dir, table + ".json")
+        if os.path.isfile(key_file):
+            with open(key_file, 'r', encoding='utf-8') as f:
+                ordered = {k: data[k] for k in json_format.load(f) if k in data}
+            # Keys missing from the key:jp file keep their index order after the others
+            ordered.update(data)
+            data = ordered
+        outputs.append((os.path.join(save_dir, table + ".json"), data, 4))
+
+    write_key_maps(outputs, jobs)
+    print("The merge is complete. \n Please execute import_db_json to import the translation file back.")
 
-            with open(translated_file, 'r', encoding='utf-8') as f:
-                translated_data = json.load(f)  # Original file - Japanese
 
-            with open(orig_file, 'r', encoding='utf-8') as f:
-                orig_data = json.load(f)  # key:Japanese file
+UNMATCHED_REPORT = "./pretranslate_todo/unmatched.json"
+STALE_REPORT = "./pretranslate_todo/stale.json"
+MERGE_STATE_PATH = "./pretranslate_todo/merge_state.json"
 
-            for k, orig_jp in orig_data.items():
-                orig_data[k] = translated_data.get(orig_jp, orig_jp)
 
-            with open(save_file, 'w', encoding='utf-8') as f:
-                json.dump(orig_data, f, ensure_ascii=False, indent=4)
+def load_translations(*translated_dirs) -> dict:
+    """
+    Read every *_translated.json (jp:en) file under translated_dirs once into { table: { jp: en } }.
+    For the same table, the files of a later directory override those of an earlier one.
+    """
+    translations = {}
+    for translated_dir in translated_dirs:
+        for root, dirs, files in os.walk(translated_dir):
+            for name in files:
+                if not name.endswith("_translated.json"):
+                    continue
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    translations.setdefault(name[:-16], {}).update(json_format.load(f))
+    return translations
+
+
+def apply_translations(key_map: dict, translated: dict, sources=None, tm=None, table=None) -> list:
+    """
+    Replace the values of a key map in place with their translation from translated (jp:en).
+    Returns the keys left unmatched, i.e. whose value is still the source text of sources
+    (key:jp; every untranslated value counts when not given).
+    With a TranslationMemory tm, values missing from translated are looked up in it if they are
+    still the source text recorded for the key, and the translations used are recorded.
+    """
+    tm_sources = tm.sources(table) if tm is not None else {}
+    unmatched = []
+    used = {}
+    for k, orig_jp in key_map.items():
+        en = translated.get(orig_jp)
+        # Only untranslated values (still equal to the source text) are looked up
+        if en is None and tm is not None and tm_sources.get(k) == orig_jp:
+            en = tm.lookup(orig_jp)
+        if en is not None:
+            used[k] = en
+            key_map[k] = en
+        elif sources is None or sources.get(k) == orig_jp:
+            unmatched.append(k)
+    if tm is not None:
+        tm.set_translations(table, used, sources)
+    return unmatched
+
+
+def write_key_map(output_file: str, key_map: dict, indent=4) -> str:
+    """
+    Write a key map through a temp file + rename, so output_file is never left half-written.
+    """
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json_format.dump(key_map, f, indent=indent)
+    os.replace(tmp_file, output_file)
+    return output_file
+
+
+def write_key_maps(outputs: list, jobs=1, on_written=None):
+    """
+    Write [(output file, key map, indent), ...], in a process pool when jobs > 1.
+    Progress is reported in the order of outputs; on_written(output file) is called after each file.
+    """
+    for output_file in run_jobs(write_key_map, outputs, jobs):
+        print("Merging files", os.path.basename(output_file))
+        if on_written is not None:
+            on_written(output_file)
+
 
-            print("Merging files", name)
+def key_map_digest(key_map: dict) -> str:
+    """
+    Fingerprint of a key map as written in the current json format.
+    """
+    content = json.dumps(key_map, ensure_ascii=False) + json_format.get_format()
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_merge_state(path=MERGE_STATE_PATH) -> dict:
+    """
+    Load the { stage: { file: fingerprint } } checkpoint of an interrupted merge_todo.
+    """
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable merge checkpoint {path}: {e}")
+        return {}
+
+
+def save_merge_state(state: dict, path=MERGE_STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def report_unmatched(key_maps: dict, unmatched: dict, report_file=UNMATCHED_REPORT):
+    """
+    Print the translation coverage of every table with untranslated texts and write the
+    untranslated texts per table to report_file as { table: [jp, ...] }.
+    """
+    report = {}
+    total = missing = 0
+    for file, key_map in key_maps.items():
+        keys = unmatched.get(file, [])
+        total += len(key_map)
+        missing += len(keys)
+        if not keys:
+            continue
+        texts = list(dict.fromkeys(key_map[k] for k in keys))
+        report[table_name(file)] = texts
+        print(f"Untranslated: {table_name(file)}: {len(keys)}/{len(key_map)} keys "
+              f"({len(texts)} unique texts), {100 * (1 - len(keys) / len(key_map)):.1f}% translated")
+
+    report_dir = os.path.dirname(report_file)
+    if report_dir and not os.path.isdir(report_dir):
+        os.makedirs(report_dir)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    if total:
+        print(f"Translated {total - missing}/{total} keys ({100 * (1 - missing / total):.1f}%), "
+              f"untranslated texts per table written to {report_file}")
+
+
+def pretranslated_to_kv_files(
+        root_dir: str,
+        translated_dir: str,
+        save_dir="pretranslate_todo/translated_out",
+        tm=None,
+        jobs=1,
+        from_master=False
+):
+    """
+    Turn the key:jp files of root_dir into key:en files using the jp:en files of translated_dir.
+    With from_master, root_dir is the master data (gakumasu-diff/json) and the key:jp maps are
+    exported from it in memory instead of being read from exports/.
+    With a TranslationMemory tm, texts missing from the jp:en files are looked up in it and
+    the translations used are recorded.
+    """
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    translations = load_translations(translated_dir)
+    key_maps = {}
+    unmatched = {}
+    for table, translated in translations.items():
+        file = table + ".json"
+        if from_master:
+            key_maps[file] = export_db_json.export_translatable_text(os.path.join(root_dir, file))
+        else:
+            with open(os.path.join(root_dir, file), 'r', encoding='utf-8') as f:
+                key_maps[file] = json_format.load(f)  # key:Japanese file
+        unmatched[file] = apply_translations(key_maps[file], translated, tm=tm, table=table)
+
+    write_key_maps([(os.path.join(save_dir, file), key_map, 4) for file, key_map in key_maps.items()], jobs)
+    report_unmatched(key_maps, unmatched)
     print("The merge is complete. \n Please execute import_db_json to import the translation file back.")
 
 
-def gen_todo(new_files_dir: str):
+def gen_todo(new_files_dir: str, keep_temp=False, tm=None, reuse=False):
     """
     Generate untranslated jp: "" file
+    The old key:en and new key:jp maps are compared in memory; with keep_temp they are also
+    written to pretranslate_todo/temp_key_en and temp_key_jp.
+    With a TranslationMemory tm the translated keys are queried from it instead of exporting
+    ./data, and the new source texts are recorded in it.
+    With reuse, texts that only differ in numbers from an already translated text are translated
+    from it (see template_match) into pretranslate_todo/todo/auto instead of the todo files.
+    Translations whose Japanese text changed since they were made (see source_index) are
+    treated as untranslated and listed in STALE_REPORT.
     """
     old_files_dir = "./data"
     temp_key_en_dir = "./pretranslate_todo/temp_key_en"
     temp_key_jp_dir = "./pretranslate_todo/temp_key_jp"
     todo_out_dir = "./pretranslate_todo/todo"
+    auto_out_dir = "./pretranslate_todo/todo/auto"
 
-    if not os.path.isdir(temp_key_en_dir):
-        os.makedirs(temp_key_en_dir)
-    if not os.path.isdir(temp_key_jp_dir):
-        os.makedirs(temp_key_jp_dir)
     if not os.path.isdir(todo_out_dir):
         os.makedirs(todo_out_dir)
-
-    # temp convert a json to key:en
-    for root, dirs, files in os.walk(old_files_dir):
-        for file in files:
-            if file.endswith(".json"):
-                input_path = os.path.join(root, file)
-                output_path = os.path.join(temp_key_en_dir, file)
-                export_db_json.ex_main(input_path, output_path)
-
-    # temp convert a json to key:jp
-    for root, dirs, files in os.walk(new_files_dir):
-        for file in files:
-            if file.endswith(".json"):
-                input_path = os.path.join(root, file)
-                output_path = os.path.join(temp_key_jp_dir, file)
-                export_db_json.ex_main(input_path, output_path)
-
-    # Traverse the new jp file
-    for root, dirs, files in os.walk(temp_key_jp_dir):
-        for file in files:
-            jp_file = os.path.join(root, file)
-            en_file = os.path.join(temp_key_en_dir, file)
-            out_data = {}
-
-            with open(jp_file, 'r', encoding='utf-8') as f:
-                jp_data = json.load(f)
-
-            if not os.path.exists(en_file):
-                for _, v in jp_data.items():
+    # merge_todo applies every auto file unattended, those of an older run must not be left behind
+    if os.path.isdir(auto_out_dir):
+        shutil.rmtree(auto_out_dir)
+
+    # convert a json to key:jp
+    jp_maps = export_db_json.export_key_maps(new_files_dir)
+    # convert a json to key:en
+    if tm is None:
+        en_maps = export_db_json.export_key_maps(old_files_dir)
+    else:
+        en_maps = {}
+        for file, jp_data in jp_maps.items():
+            en_maps[file] = tm.translations(table_name(file))
+            tm.set_sources(table_name(file), jp_data)
+        tm.commit()
+
+    # Outdated translations are dropped, so their new texts get translated again
+    source_index = load_source_index()
+    stale = {}
+    for file, jp_data in jp_maps.items():
+        stale[file] = stale_keys(source_index, file, en_maps.get(file, {}), jp_data)
+    write_stale_report(stale, en_maps, jp_maps, STALE_REPORT)
+    for file, keys in stale.items():
+        if keys:
+            keys = set(keys)
+            en_maps[file] = {k: v for k, v in en_maps[file].items() if k not in keys}
+
+    if keep_temp:
+        for temp_dir, key_maps in ((temp_key_en_dir, en_maps), (temp_key_jp_dir, jp_maps)):
+            if not os.path.isdir(temp_dir):
+                os.makedirs(temp_dir)
+            for file, key_map in key_maps.items():
+                export_db_json.write_export(key_map, os.path.join(temp_dir, file))
+
+    template_index = None
+    if reuse:
+        template_index = TemplateIndex()
+        for file, jp_data in jp_maps.items():
+            en_data = en_maps.get(file, {})
+            for k, v in jp_data.items():
+                if k in en_data:
+                    template_index.add(v, en_data[k])
+
+    # Traverse the new jp maps
+    auto_total = 0
+    for file, jp_data in jp_maps.items():
+        out_data = {}
+        auto_data = {}
+
+        en_data = en_maps.get(file, {})
+        for k, v in jp_data.items():
+            if k not in en_data:
+                filled = template_index.fill(v) if template_index else None
+                if filled is None:
                     out_data[v] = ""
-            else:
-                with open(en_file, 'r', encoding='utf-8') as f:
-                    en_data = json.load(f)
-                for k, v in jp_data.items():
-                    if k not in en_data:
-                        out_data[v] = ""
+                else:
+                    auto_data[v] = filled
+
+        if auto_data:
+            if not os.path.isdir(auto_out_dir):
+                os.makedirs(auto_out_dir)
+            with open(os.path.join(auto_out_dir, file[:-5] + "_translated.json"), 'w', encoding='utf-8') as f:
+                json.dump(auto_data, f, ensure_ascii=False, indent=4)
+            auto_total += len(auto_data)
+
+        if out_data:
+            todo_file = os.path.join(todo_out_dir, file)
+            with open(todo_file, 'w', encoding='utf-8') as f:
+                json.dump(out_data, f, ensure_ascii=False, indent=4)
+            print("TODO File", todo_file)
+
+    if auto_total:
+        print(f"Translated {auto_total} texts from existing templates into {auto_out_dir}")
+
+
+def record_current_sources(new_files_dir="gakumasu-diff/json"):
+    """
+    Record the current Japanese texts of every key translated in ./data as their source
+    (see source_index), e.g. to start tracking outdated translations on an existing data folder.
+    merge_todo keeps the index up to date afterwards.
+    """
+    jp_maps = export_db_json.export_key_maps(new_files_dir)
+    en_maps = export_db_json.export_key_maps("./data")
+    source_index = load_source_index()
+    for file, en_map in en_maps.items():
+        if file in jp_maps:
+            record_sources(source_index, file, jp_maps[file], en_map)
+    save_source_index(source_index)
+    print(f"Recorded the source texts of {sum(len(v) for v in source_index.values())} translations")
 
-            if out_data:
-                todo_file = os.path.join(todo_out_dir, file)
-                with open(todo_file, 'w', encoding='utf-8') as f:
-                    json.dump(out_data, f, ensure_ascii=False, indent=4)
-                print("TODO File", todo_file)
 
+def merge_todo(tm=None, jobs=1, yes=False):
+    """
+    Merge the old translations and the translated todo files into key:en maps of the new
+    master data (pretranslate_todo/merged) and optionally import them into ./data.
+    All jp:en files are read once and applied to the in-memory maps, then every table is written once.
 
-def merge_todo():
+    Writing the merged files and importing them are checkpointed per file in MERGE_STATE_PATH, so
+    a rerun after a crash only redoes the files whose inputs changed or that were not done yet.
+    With yes, the import runs without asking.
+    """
     new_files_dir = "./pretranslate_todo/todo/new"  # jp:en files
-    old_trans_dir = "./pretranslate_todo/temp_key_en"  # old key:en files
-    new_key_jp_dir = "./pretranslate_todo/temp_key_jp"  # key:jp files
+    auto_files_dir = "./pretranslate_todo/todo/auto"  # jp:en files from gen_todo --reuse
     output_dir = "./pretranslate_todo/merged"  # merged key:en files
 
     if not os.path.isdir(output_dir):
         os.makedirs(output_dir)
 
-    # First copy the new key:jp to the output folder
-    for root, dirs, files in os.walk(new_key_jp_dir):
-        for file in files:
-            if file.endswith(".json"):
-                shutil.copyfile(os.path.join(root, file), os.path.join(output_dir, file))
-
-    # Merge old translations
-    for root, dirs, files in os.walk(old_trans_dir):
-        for file in files:
-            if file.endswith(".json"):
-                old_key_en_file = os.path.join(root, file)  # root = old version key:en
-                new_key_jp_file = os.path.join(output_dir, file)  # output_dir = new version key:jp
-
-                with open(old_key_en_file, 'r', encoding='utf-8') as f:
-                    old_key_en_data: dict = json.load(f)
-                if os.path.exists(new_key_jp_file):
-                    with open(new_key_jp_file, 'r', encoding='utf-8') as f:
-                        new_key_jp_data = json.load(f)
-                else:
-                    new_key_jp_data = {}
-
-                for k, v in old_key_en_data.items():
-                    new_key_jp_data[k] = v
-
-                with open(new_key_jp_file, 'w', encoding='utf-8') as f:
-                    json.dump(new_key_jp_data, f, ensure_ascii=False, indent=4)
-
-    pretranslated_to_kv_files(output_dir, new_files_dir, output_dir)
+    if tm is None:
+        old_key_en_maps = export_db_json.export_key_maps("./data")  # old key:en
+    else:
+        old_key_en_maps = {}
+        for table in tm.tables():
+            translations = tm.translations(table)
+            if translations:
+                old_key_en_maps[table + ".json"] = translations
+    new_key_jp_maps = export_db_json.export_key_maps("./gakumasu-diff/json")  # new key:jp
+
+    # The translator's files take precedence over the texts translated by gen_todo --reuse
+    translations = load_translations(auto_files_dir, new_files_dir)
+
+    # Old translations of texts that changed since they were translated are not merged
+    source_index = load_source_index()
+    stale = {file: stale_keys(source_index, file, old_key_en_data, new_key_jp_maps.get(file, {}))
+             for file, old_key_en_data in old_key_en_maps.items()}
+    write_stale_report(stale, old_key_en_maps, new_key_jp_maps, STALE_REPORT)
+
+    # The new key:jp maps with the old translations merged in
+    key_maps = {}
+    indents = {}
+    for file, new_key_jp_data in new_key_jp_maps.items():
+        if file not in old_key_en_maps:
+            key_maps[file] = dict(new_key_jp_data)
+            indents[file] = 2  # plain export_db_json output, unless translated below
+    for file, old_key_en_data in old_key_en_maps.items():
+        key_map = dict(new_key_jp_maps.get(file, {}))
+        key_map.update(old_key_en_data)
+        for k in stale[file]:
+            key_map[k] = new_key_jp_maps[file][k]
+        key_maps[file] = key_map
+        indents[file] = 4
+
+    unmatched = {}
+    for file, key_map in key_maps.items():
+        table = table_name(file)
+        translated = translations.get(table)
+        if translated is None:
+            sources = new_key_jp_maps.get(file, {})
+            unmatched[file] = [k for k, v in key_map.items() if sources.get(k) == v]
+            continue
+        unmatched[file] = apply_translations(key_map, translated, new_key_jp_maps.get(file, {}), tm=tm, table=table)
+        indents[file] = 4
+    if tm is not None:
+        tm.commit()
+
+    # Stage 1: write the merged key:en files
+    state = load_merge_state()
+    merged_state = state.setdefault("merged", {})
+    digests = {file: key_map_digest(key_map) for file, key_map in key_maps.items()}
+    outputs = []
+    for file, key_map in key_maps.items():
+        output_file = os.path.join(output_dir, file)
+        if merged_state.get(file) == digests[file] and os.path.isfile(output_file):
+            continue
+        merged_state.pop(file, None)
+        outputs.append((output_file, key_map, indents[file]))
+    if len(outputs) < len(key_maps):
+        print(f"Resuming merge: {len(key_maps) - len(outputs)} merged files are up to date")
+
+    def on_merged(output_file):
+        file = os.path.basename(output_file)
+        merged_state[file] = digests[file]
+        save_merge_state(state)
+
+    save_merge_state(state)
+    write_key_maps(outputs, jobs, on_written=on_merged)
+    report_unmatched(key_maps, unmatched)
+
+    if not yes and input("If you want to import the db to json, please enter 1:") != "1":
+        return
 
-    if input("If you want to import the db to json, please enter 1:") == "1":
-        import_db_json.main("./gakumasu-diff/json", output_dir, "data")
-        print("Files exported into data folder")
+    # Stage 2: import the merged files into ./data
+    base_dir = "./gakumasu-diff/json"
+    data_dir = "data"
+    imported_state = state.setdefault("imported", {})
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    skipped = 0
+    tasks = []
+    fingerprints = {}
+    for file in key_maps:
+        base_json = os.path.join(base_dir, file)
+        data_json = os.path.join(data_dir, file)
+        if not os.path.isfile(base_json):
+            print(f"Skipping {file}: the table is not in {base_dir} anymore")
+            continue
+        fingerprints[file] = digests[file] + ":" + file_digest(base_json)
+        if imported_state.get(file) == fingerprints[file] and os.path.isfile(data_json):
+            skipped += 1
+            continue
+        tasks.append((base_json, os.path.join(output_dir, file), data_json))
+    if skipped:
+        print(f"Resuming import: {skipped} files were already imported")
+
+    failed = []
+    for result in import_db_json.import_files(tasks, jobs):
+        if result["error"]:
+            failed.append(result)
+            continue
+        file = os.path.basename(result["output"])
+        if tm is not None:
+            tm.set_translations(table_name(file), key_maps[file], new_key_jp_maps.get(file))
+        imported_state[file] = fingerprints[file]
+        save_merge_state(state)
+    # Remember which Japanese texts data/ is now translated from
+    failed_files = {os.path.basename(result["output"]) for result in failed}
+    for file in fingerprints:
+        if file not in failed_files:
+            record_sources(source_index, file, new_key_jp_maps.get(file, {}), key_maps[file])
+    save_source_index(source_index)
+
+    if failed:
+        print(f"{len(failed)} files failed to import, fix them and run the merge again to resume:")
+        for result in failed:
+            print(f"  {result['translated']}: {result['error']}")
+        sys.exit(1)
+    print("Files exported into data folder")
+
+    # Everything is done, the next merge starts from scratch
+    os.remove(MERGE_STATE_PATH)
 
 
 def main():
@@ -176,46 +598,93 @@ def main():
     parser.add_argument('--import_back',action='store_true')
     parser.add_argument('--export', action='store_true')
     parser.add_argument('--export_csv',action='store_true')
+    parser.add_argument('--dedup', action='store_true',
+                        help="With --export/--export_csv/--import_back: one file of unique texts "
+                             "for all tables (pretranslate_todo/unique_out)")
+    parser.add_argument('--direct', action='store_true',
+                        help="With --export/--export_csv/--import_back: read gakumasu-diff/json directly "
+                             "instead of the exports folder of export_db_json")
+    parser.add_argument('--record-sources', action='store_true',
+                        help="Record the current Japanese texts of data/ as their sources (data_sources.json)")
+    parser.add_argument('--reuse', action='store_true',
+                        help="With --gen_todo: translate texts that only differ in numbers from a translated text")
+    parser.add_argument('--tm', nargs='?', const=DEFAULT_TM_PATH, metavar="PATH",
+                        help="Use the translation memory (see translation_memory.py build)")
+    parser.add_argument('--keep-temp', action='store_true',
+                        help="Also write the key:en / key:jp maps of --gen_todo to pretranslate_todo/temp_key_*")
+    parser.add_argument('--yes', '-y', action='store_true',
+                        help="With --merge: import into data without asking")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Number of worker processes for --merge/--import_back and --direct exports (0 = one per CPU)")
+    json_format.add_format_argument(parser)
     args = parser.parse_args()
-
-
-    if len(sys.argv)==1:
-        do_idx = input("[1] Export all to files to be translated\n"
-                       "[2] Compare and update to generate todo files\n"
-                       "[3] Convert translation files (jp:en) back to key-value json\n"
-                       "[4] Merge the translated todo files back to plugin json\n"
-                       "Please select an operation: ")
-    elif args.gen_todo:
-        gen_todo("gakumasu-diff/json")
-        return
-    elif args.merge:
-        do_idx = "4"
-    elif args.import_back:
-        pretranslated_to_kv_files('exports','pretranslate_todo/full_out')
-        return
-    elif args.export:
-        values_to_keys('exports')
-        return
-    elif args.export_csv:
-        values_to_keys('exports',output_type='csv')
-        return
-    else:
-        raise RuntimeError("Invalid Arguments.")
-
-    if do_idx == "1":
-        values_to_keys(input("Input export folder(or press enter for default): ") or "exports")
-
-    elif do_idx == "2":
-        gen_todo(input("Input gakumasu_diff_to_json folder(or press enter for default): ") or "gakumasu-diff/json")
-
-    elif do_idx == "3":
-        pretranslated_to_kv_files(
-            root_dir=input("Input export folder(or press enter for default): ") or "exports",
-            translated_dir=input("Input translated(jp:en format) folder(or press enter for default): ") or "pretranslate_todo/full_out"
-        )
-
-    elif do_idx == "4":
-        merge_todo()
+    json_format.apply_format_argument(args)
+    jobs = resolve_jobs(args.jobs)
+
+
+    tm = TranslationMemory(args.tm) if args.tm else None
+    try:
+        if len(sys.argv)==1:
+            do_idx = input("[1] Export all to files to be translated\n"
+                           "[2] Compare and update to generate todo files\n"
+                           "[3] Convert translation files (jp:en) back to key-value json\n"
+                           "[4] Merge the translated todo files back to plugin json\n"
+                           "Please select an operation: ")
+        elif args.gen_todo:
+            gen_todo("gakumasu-diff/json", keep_temp=args.keep_temp, tm=tm, reuse=args.reuse)
+            return
+        elif args.merge:
+            do_idx = "4"
+        elif args.record_sources:
+            record_current_sources()
+            return
+        elif args.import_back and args.dedup:
+            unique_to_kv_files(jobs=jobs)
+            return
+        elif args.import_back and args.direct:
+            pretranslated_to_kv_files('gakumasu-diff/json', 'pretranslate_todo/full_out', tm=tm, jobs=jobs,
+                                      from_master=True)
+            return
+        elif args.import_back:
+            pretranslated_to_kv_files('exports','pretranslate_todo/full_out', tm=tm, jobs=jobs)
+            return
+        elif (args.export or args.export_csv) and args.direct:
+            results = master_to_todo_files(output_type='json' if args.export else 'csv', jobs=jobs)
+            if any(r["error"] for r in results):
+                sys.exit(1)
+            return
+        elif (args.export or args.export_csv) and args.dedup:
+            values_to_unique('exports', output_type='json' if args.export else 'csv')
+            return
+        elif args.export:
+            values_to_keys('exports')
+            return
+        elif args.export_csv:
+            values_to_keys('exports',output_type='csv')
+            return
+        else:
+            raise RuntimeError("Invalid Arguments.")
+
+        if do_idx == "1":
+            values_to_keys(input("Input export folder(or press enter for default): ") or "exports")
+
+        elif do_idx == "2":
+            gen_todo(input("Input gakumasu_diff_to_json folder(or press enter for default): ") or "gakumasu-diff/json", tm=tm)
+
+        elif do_idx == "3":
+            pretranslated_to_kv_files(
+                root_dir=input("Input export folder(or press enter for default): ") or "exports",
+                translated_dir=input("Input translated(jp:en format) folder(or press enter for default): ") or "pretranslate_todo/full_out",
+                tm=tm,
+                jobs=jobs
+            )
+
+        elif do_idx == "4":
+            merge_todo(tm, jobs=jobs, yes=args.yes)
+    finally:
+        if tm is not None:
+            tm.commit()
+            tm.close()
 
 
 if __name__ == '__main__':
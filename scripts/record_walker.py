@@ -0,0 +1,144 @@
+import re
+from functools import partial
+
+# (path segments) -> (raw path, normalized path), shared by every record of every table
+_path_cache = {}
+# raw path -> path segments, the reverse of _path_cache
+_segment_cache = {}
+
+PATH_SEGMENT_PATTERN = re.compile(r"\[(\d+)\]|([^.\[\]]+)")
+
+
+def normalize_path(path_str: str) -> str:
+    """
+    Converts something like 'produceDescriptions[0].produceDescriptionType'
+    to 'produceDescriptions.produceDescriptionType'
+    removing only the [number] layer so it matches primaryKeys.
+    """
+    return re.sub(r"\[\d+\]", "", path_str)
+
+
+def path_strings(path: tuple):
+    """
+    Return the (raw, normalized) path strings of a path tuple such as ('produceDescriptions', 0, 'text'),
+    i.e. ('produceDescriptions[0].text', 'produceDescriptions.text').
+    Records of a table share their paths, so each one is built and normalized only once.
+    """
+    cached = _path_cache.get(path)
+    if cached is None:
+        raw = ""
+        for segment in path:
+            if isinstance(segment, int):
+                raw = raw + f"[{segment}]"
+            else:
+                raw = raw + "." + segment if raw else segment
+        cached = _path_cache[path] = (raw, normalize_path(raw))
+    return cached
+
+
+def parse_path(raw: str) -> tuple:
+    """
+    The reverse of path_strings: 'produceDescriptions[0].text' -> ('produceDescriptions', 0, 'text').
+    """
+    segments = _segment_cache.get(raw)
+    if segments is None:
+        segments = _segment_cache[raw] = tuple(
+            int(index) if index else name for index, name in PATH_SEGMENT_PATTERN.findall(raw))
+    return segments
+
+
+def split_full_key(full_key: str):
+    """
+    "p_card-01|1|produceDescriptions[0].text" -> ("p_card-01|1", "produceDescriptions[0].text")
+    """
+    base_key, _, raw = full_key.rpartition("|")
+    return base_key, raw
+
+
+def build_base_key(data_obj: dict, primary_keys: list) -> str:
+    """
+    Put all primary key values of a record together, e.g. "p_card-01|1".
+    For 'list.field' primary keys the field of the first list item is used.
+    """
+    pk_parts = []
+    for pk in primary_keys:
+        if "." not in pk:
+            val = data_obj.get(pk, "")
+            pk_parts.append(str(val))
+        else:
+            top_level, sub_field = pk.split(".", 1)
+            top_val = data_obj.get(top_level, None)
+            if isinstance(top_val, list) and len(top_val) > 0 and isinstance(top_val[0], dict):
+                sub_val = top_val[0].get(sub_field, "")
+                pk_parts.append(str(sub_val))
+            elif isinstance(top_val, dict):
+                sub_val = top_val.get(sub_field, "")
+                pk_parts.append(str(sub_val))
+            else:
+                pk_parts.append("")
+    return "|".join(pk_parts)
+
+
+def walk_record(data_obj: dict, primary_keys: list, skip_primary_keys=False):
+    """
+    Yield (fullKey, value, setter) for every text leaf of a record.
+    A text leaf is a string or a list of strings (also an empty list) stored under a dict key;
+    fullKey is "baseKey|path" as used in the key:text export files and setter(new_value)
+    replaces the leaf in data_obj. Lists of dicts/lists are descended into with [index] paths.
+    With skip_primary_keys, leaves whose normalized path is a primary key are left out.
+    """
+    base_prefix = build_base_key(data_obj, primary_keys) + "|"
+    pk_set = set(primary_keys) if skip_primary_keys else ()
+
+    def traverse(obj, path):
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if isinstance(v, dict):
+                    yield from traverse(v, path + (k,))
+                elif isinstance(v, str) or (isinstance(v, list) and (not v or isinstance(v[0], str))):
+                    raw, normalized = path_strings(path + (k,))
+                    if normalized not in pk_set:
+                        yield base_prefix + raw, v, partial(obj.__setitem__, k)
+                elif isinstance(v, list):
+                    yield from traverse(v, path + (k,))
+        elif isinstance(obj, list):
+            for idx, item in enumerate(obj):
+                if isinstance(item, (dict, list)):
+                    yield from traverse(item, path + (idx,))
+
+    return traverse(data_obj, ())
+
+
+def find_leaf(data_obj: dict, path: tuple):
+    """
+    Resolve a path tuple on a record the way walk_record reaches its text leaves.
+    Returns (parent dict, field name) of the leaf, or None if walk_record would not yield the path.
+    """
+    obj = data_obj
+    last = len(path) - 1
+    for i, segment in enumerate(path):
+        if isinstance(segment, int):
+            if not isinstance(obj, list) or segment >= len(obj) or not isinstance(obj[segment], (dict, list)):
+                return None
+            obj = obj[segment]
+            continue
+        if not isinstance(obj, dict) or segment not in obj:
+            return None
+        v = obj[segment]
+        is_leaf = isinstance(v, str) or (isinstance(v, list) and (not v or isinstance(v[0], str)))
+        if i == last:
+            return (obj, segment) if is_leaf else None
+        if is_leaf or not isinstance(v, (dict, list)):
+            return None
+        obj = v
+    return None
+
+
+def index_records(records: list, primary_keys: list) -> dict:
+    """
+    { baseKey: [record, ...] } of the records of a table (baseKeys are not always unique).
+    """
+    index = {}
+    for record in records:
+        index.setdefault(build_base_key(record, primary_keys), []).append(record)
+    return index
@@ -0,0 +1,72 @@
+import json
+import os
+
+from translation_memory import table_name, text_hash
+
+# { table: { fullKey: fingerprint of the Japanese text the entry of data/ was translated from } }
+# Committed with data/ (which the plugin ships as a whole), so every checkout checks against it
+SOURCE_INDEX_PATH = "data_sources.json"
+
+
+def fingerprint(text: str) -> str:
+    # 32 bits are plenty to notice that the text of one key changed
+    return text_hash(text)[:8]
+
+
+def load_source_index(path=SOURCE_INDEX_PATH) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable source index {path}: {e}")
+        return {}
+
+
+def save_source_index(index: dict, path=SOURCE_INDEX_PATH):
+    """
+    Write the index sorted and without indentation, one key per line so changes diff per key.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=0, separators=(",", ":"), sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def record_sources(index: dict, file: str, jp_map: dict, keys):
+    """
+    Record the fingerprints of the current Japanese texts of keys, replacing the table's entries.
+    """
+    index[table_name(file)] = {k: fingerprint(jp_map[k]) for k in keys if k in jp_map}
+
+
+def stale_keys(index: dict, file: str, en_map: dict, jp_map: dict) -> list:
+    """
+    The translated keys of en_map whose Japanese text in jp_map is no longer the one they were
+    translated from. Keys without a recorded fingerprint are never stale.
+    """
+    fingerprints = index.get(table_name(file))
+    if not fingerprints:
+        return []
+    return [k for k in en_map
+            if k in fingerprints and k in jp_map and fingerprints[k] != fingerprint(jp_map[k])]
+
+
+def write_stale_report(stale: dict, en_maps: dict, jp_maps: dict, report_file: str):
+    """
+    Write { table: { fullKey: {"jp": new text, "en": outdated translation} } } of stale keys ({ file: [key] }).
+    """
+    report = {table_name(file): {k: {"jp": jp_maps[file][k], "en": en_maps[file][k]} for k in keys}
+              for file, keys in stale.items() if keys}
+    report_dir = os.path.dirname(report_file)
+    if report_dir and not os.path.isdir(report_dir):
+        os.makedirs(report_dir)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    total = sum(len(keys) for keys in report.values())
+    if total:
+        print(f"{total} translations are outdated (the Japanese text changed), listed in {report_file}")
@@ -0,0 +1,116 @@
+import re
+from collections import Counter
+
+# {0}, {threshold}, <nobr>, <color=#...> etc. stay literal; numbers are the template parameters
+TOKEN_PATTERN = re.compile(r"(\{[^{}]*\}|<[^<>]*>)|([0-9０-９]+(?:[.．][0-9０-９]+)?)")
+PARAM = "\ue001"
+FULLWIDTH_DIGITS = str.maketrans("０１２３４５６７８９．", "0123456789.")
+
+
+def to_template(text: str):
+    """
+    Split text into (template, params): every number outside of {...} / <...> is replaced by PARAM.
+    "内3回）" -> ("内" + PARAM + "回）", ["3"])
+    """
+    params = []
+    parts = []
+    last = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        if match.group(2) is None:
+            continue
+        parts.append(text[last:match.start()])
+        parts.append(PARAM)
+        params.append(match.group(2))
+        last = match.end()
+    if not params:
+        return text, params
+    parts.append(text[last:])
+    return "".join(parts), params
+
+
+def normalize_number(value: str) -> str:
+    return value.translate(FULLWIDTH_DIGITS)
+
+
+def is_singular(value: str) -> bool:
+    """
+    Whether an English noun after this (normalized) number is singular: "1 turn", "3 turns".
+    """
+    return float(value) == 1
+
+
+def translation_template(params: list, translation: str):
+    """
+    Express a translation in terms of the source params: a tuple of literal strings and param indices.
+    Returns None if the translation cannot be reused safely, i.e. a number in it matches no source
+    param or a source param value is shared by several params.
+    """
+    values = [normalize_number(p) for p in params]
+    if len(set(values)) != len(values):
+        return None
+
+    segments = []
+    last = 0
+    for match in TOKEN_PATTERN.finditer(translation):
+        if match.group(2) is None:
+            continue
+        value = normalize_number(match.group(2))
+        if value not in values:
+            return None
+        segments.append(translation[last:match.start()])
+        # Keep the digit style of the translation (ASCII vs fullwidth)
+        segments.append((values.index(value), match.group(2) == value))
+        last = match.end()
+    segments.append(translation[last:])
+    return tuple(segments)
+
+
+class TemplateIndex:
+    """
+    Index of existing jp -> en translations by their number-free template, so that texts which only
+    differ in numbers from an already translated text can be translated automatically.
+    Candidates are found by a dict lookup on the template, so the cost does not grow with the corpus.
+    """
+    def __init__(self):
+        # template -> Counter of (translation template, fixed params, singular params) candidates
+        self.templates = {}
+
+    def add(self, source: str, translation: str):
+        template, params = to_template(source)
+        if not params or source == translation:
+            return
+        en_template = translation_template(params, translation)
+        if en_template is None:
+            return
+        used = frozenset(s[0] for s in en_template if isinstance(s, tuple))
+        values = [normalize_number(p) for p in params]
+        # Params not used by the translation must keep their value for it to stay correct
+        fixed = tuple((i, values[i]) for i in range(len(params)) if i not in used)
+        # The translation only fits numbers of the same grammatical number: "for 1 turn" must
+        # not become "for 3 turn", nor "for 3 turns" "for 1 turns"
+        singular = tuple((i, is_singular(values[i])) for i in sorted(used))
+        self.templates.setdefault(template, Counter())[(en_template, fixed, singular)] += 1
+
+    def fill(self, source: str):
+        """
+        Translate source from the most common matching template, or return None.
+        """
+        template, params = to_template(source)
+        candidates = self.templates.get(template)
+        if not candidates:
+            return None
+        values = [normalize_number(p) for p in params]
+        for (en_template, fixed, singular), _ in candidates.most_common():
+            if any(values[i] != value for i, value in fixed):
+                continue
+            if any(is_singular(values[i]) != one for i, one in singular):
+                continue
+            parts = []
+            for segment in en_template:
+                if isinstance(segment, tuple):
+                    idx, ascii_digits = segment
+                    parts.append(values[idx] if ascii_digits else params[idx])
+                else:
+                    parts.append(segment)
+            return "".join(parts)
+        return None
@@ -0,0 +1,164 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+
+DEFAULT_TM_PATH = "translation_memory.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    table_name TEXT NOT NULL,
+    full_key TEXT NOT NULL,
+    source TEXT,
+    source_hash TEXT,
+    translation TEXT,
+    PRIMARY KEY (table_name, full_key)
+);
+CREATE INDEX IF NOT EXISTS entries_source_hash ON entries (source_hash);
+"""
+
+# Rows with a real translation; memories written before untranslated values were skipped may
+# still hold the source text as translation
+TRANSLATED = "translation IS NOT NULL AND (source IS NULL OR translation <> source)"
+
+
+def text_hash(text: str) -> str:
+    """
+    Compact fingerprint of a source string, used to index entries by their Japanese text.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def table_name(file_name: str) -> str:
+    """
+    "ProduceItem.json" -> "ProduceItem"
+    """
+    return file_name[:-5] if file_name.endswith(".json") else file_name
+
+
+class TranslationMemory:
+    """
+    sqlite3 store of every key:jp / key:en pair, indexed by (table, fullKey) and by source text hash.
+    Tables are named after the json files (without .json); keys are the fullKeys of export_db_json.
+    """
+    def __init__(self, path=DEFAULT_TM_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def set_sources(self, table: str, key_map: dict):
+        """
+        Record { fullKey: jp } source texts, keeping existing translations
+        (unless they are the new source text itself).
+        """
+        self.conn.executemany(
+            "INSERT INTO entries (table_name, full_key, source, source_hash) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (table_name, full_key) DO UPDATE SET source = excluded.source, "
+            "source_hash = excluded.source_hash, translation = NULLIF(entries.translation, excluded.source)",
+            ((table, k, v, text_hash(v)) for k, v in key_map.items()))
+
+    def set_translations(self, table: str, key_map: dict, sources=None):
+        """
+        Record { fullKey: en } translations, keeping existing source texts.
+        A value equal to the source text of its key (from sources { fullKey: jp } or the recorded one)
+        is an untranslated text: it clears the translation of the key instead.
+        """
+        sources = sources or {}
+        self.conn.executemany(
+            "INSERT INTO entries (table_name, full_key, translation) VALUES (?, ?, ?) "
+            "ON CONFLICT (table_name, full_key) DO UPDATE SET "
+            "translation = NULLIF(excluded.translation, entries.source)",
+            ((table, k, None if v == sources.get(k) else v) for k, v in key_map.items()))
+
+    def tables(self) -> list:
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT table_name FROM entries ORDER BY table_name")]
+
+    def translations(self, table: str) -> dict:
+        """
+        { fullKey: en } of every translated key of a table.
+        """
+        return dict(self.conn.execute(
+            "SELECT full_key, translation FROM entries WHERE table_name = ? AND " + TRANSLATED,
+            (table,)))
+
+    def sources(self, table: str) -> dict:
+        """
+        { fullKey: jp } of every key of a table with a known source text.
+        """
+        return dict(self.conn.execute(
+            "SELECT full_key, source FROM entries WHERE table_name = ? AND source IS NOT NULL",
+            (table,)))
+
+    def lookup(self, source: str):
+        """
+        The most common translation of a source text across all tables, or None.
+        """
+        row = self.conn.execute(
+            "SELECT translation FROM entries "
+            "WHERE source_hash = ? AND source = ? AND " + TRANSLATED + " "
+            "GROUP BY translation ORDER BY COUNT(*) DESC, translation LIMIT 1",
+            (text_hash(source), source)).fetchone()
+        return row[0] if row else None
+
+    def stats(self) -> dict:
+        total, sources, translated = self.conn.execute(
+            "SELECT COUNT(*), COUNT(source), COUNT(CASE WHEN " + TRANSLATED + " THEN 1 END) FROM entries").fetchone()
+        tables = self.conn.execute("SELECT COUNT(DISTINCT table_name) FROM entries").fetchone()[0]
+        return {"tables": tables, "entries": total, "sources": sources, "translated": translated}
+
+
+def build(tm: TranslationMemory, data_dir="data", source_dir="gakumasu-diff/json"):
+    """
+    Fill the translation memory from the plugin json (key:en) and the master json (key:jp).
+    """
+    import export_db_json  # export_db_json records into the memory itself, import lazily
+
+    source_maps = export_db_json.export_key_maps(source_dir)
+    for file, key_map in source_maps.items():
+        tm.set_sources(table_name(file), key_map)
+    # data/ keeps the Japanese text of untranslated keys, those are not translations
+    for file, key_map in export_db_json.export_key_maps(data_dir).items():
+        tm.set_translations(table_name(file), key_map, source_maps.get(file))
+    tm.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translation memory (sqlite3) maintenance")
+    parser.add_argument('command', choices=['build', 'lookup', 'stats'])
+    parser.add_argument('text', nargs='?', help="Japanese text for lookup")
+    parser.add_argument('--tm', default=DEFAULT_TM_PATH)
+    parser.add_argument('--data-dir', default="data")
+    parser.add_argument('--source-dir', default="gakumasu-diff/json")
+    args = parser.parse_args()
+
+    if args.command != 'build' and not os.path.isfile(args.tm):
+        parser.error(f"{args.tm} does not exist, run build first")
+
+    with TranslationMemory(args.tm) as tm:
+        if args.command == 'build':
+            build(tm, args.data_dir, args.source_dir)
+        elif args.command == 'lookup':
+            if args.text is None:
+                parser.error("lookup needs the text to look up")
+            print(tm.lookup(args.text))
+            return
+        for k, v in tm.stats().items():
+            print(f"{k}: {v}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+
+import json_format
+from compare_json import is_table
+from export_db_json import collect_translatable_text
+from record_walker import build_base_key
+
+MASTER_JSON_DIR = "gakumasu-diff/json"
+REPORT_PATH = "./pretranslate_todo/upstream_changes.json"
+
+
+def blob_id(path: str) -> str:
+    """
+    The git blob id of a file, so folder and git revision snapshots share their fingerprints.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def dir_snapshot(json_dir: str) -> dict:
+    """
+    { file name: (fingerprint, loader) } of the json tables of a folder; the fingerprint is the git blob id.
+    """
+    snapshot = {}
+    for name in sorted(os.listdir(json_dir)):
+        if name.endswith(".json"):
+            path = os.path.join(json_dir, name)
+            snapshot[name] = (blob_id(path), lambda path=path: load_file(path))
+    return snapshot
+
+
+def load_file(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json_format.load(f)
+
+
+def git_snapshot(rev: str, json_dir=MASTER_JSON_DIR) -> dict:
+    """
+    { file name: (fingerprint, loader) } of the json tables of json_dir at a git revision of this
+    repository; the fingerprint is the blob id, so unchanged tables are never read.
+    """
+    try:
+        result = subprocess.run(["git", "ls-tree", "-z", rev, json_dir.rstrip("/") + "/"],
+                                capture_output=True, text=True, encoding="utf-8", check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise ValueError(f"Cannot list {json_dir} at {rev}: {getattr(e, 'stderr', '') or e}")
+
+    snapshot = {}
+    for entry in result.stdout.split("\0"):
+        if not entry:
+            continue
+        info, path = entry.split("\t", 1)
+        name = os.path.basename(path)
+        if name.endswith(".json"):
+            blob = info.split()[2]
+            snapshot[name] = (blob, lambda blob=blob: load_blob(blob))
+    return snapshot
+
+
+def load_blob(blob: str):
+    result = subprocess.run(["git", "cat-file", "blob", blob], capture_output=True, check=True)
+    return json_format.loads(result.stdout.decode("utf-8"))
+
+
+def index_table(root: dict) -> dict:
+    """
+    { baseKey: [record, ...] } of a table; records sharing a baseKey are kept in order.
+    """
+    primary_keys = root["rules"]["primaryKeys"]
+    index = {}
+    for record in root["data"]:
+        index.setdefault(build_base_key(record, primary_keys), []).append(record)
+    return index
+
+
+def diff_table(old_root: dict, new_root: dict) -> dict:
+    """
+    Records and texts that changed between two versions of a table, in one pass over each.
+    Records are matched by baseKey (their primary key values); a record whose primary key changed
+    is removed + added. "texts" lists the translatable texts (as exported by export_db_json)
+    by fullKey: added, removed, and changed ({"old", "new"}) under the same fullKey.
+    """
+    old_index, new_index = index_table(old_root), index_table(new_root)
+    old_keys, new_keys = old_root["rules"]["primaryKeys"], new_root["rules"]["primaryKeys"]
+    added, removed, modified = [], [], []
+    old_texts, new_texts = {}, {}
+
+    for base_key in list(old_index) + [k for k in new_index if k not in old_index]:
+        old_records, new_records = old_index.get(base_key, []), new_index.get(base_key, [])
+        for idx in range(max(len(old_records), len(new_records))):
+            old_record = old_records[idx] if idx < len(old_records) else None
+            new_record = new_records[idx] if idx < len(new_records) else None
+            if old_record == new_record:
+                continue
+            if old_record is None:
+                added.append(base_key)
+            elif new_record is None:
+                removed.append(base_key)
+            else:
+                modified.append(base_key)
+            if old_record is not None:
+                old_texts.update(collect_translatable_text(old_record, old_keys))
+            if new_record is not None:
+                new_texts.update(collect_translatable_text(new_record, new_keys))
+
+    texts = {
+        "added": {k: v for k, v in new_texts.items() if k not in old_texts},
+        "removed": {k: v for k, v in old_texts.items() if k not in new_texts},
+        "changed": {k: {"old": v, "new": new_texts[k]} for k, v in old_texts.items()
+                    if k in new_texts and new_texts[k] != v},
+    }
+    return {"added": added, "removed": removed, "modified": modified, "texts": texts}
+
+
+def diff_snapshots(old: dict, new: dict) -> dict:
+    """
+    Compare two snapshots (dir_snapshot / git_snapshot). Tables with the same fingerprint are skipped.
+    Returns {"added_tables", "removed_tables", "tables": { table: diff_table result }} with only changed tables.
+    """
+    report = {
+        "added_tables": sorted(name[:-5] for name in new if name not in old),
+        "removed_tables": sorted(name[:-5] for name in old if name not in new),
+        "tables": {},
+    }
+    for name in sorted(old.keys() & new.keys()):
+        (old_fingerprint, load_old), (new_fingerprint, load_new) = old[name], new[name]
+        if old_fingerprint == new_fingerprint:
+            continue
+        old_root, new_root = load_old(), load_new()
+        if not (is_table(old_root) and is_table(new_root)):
+            print(f"Skipping {name}: not a table with rules.primaryKeys and data")
+            continue
+        table = diff_table(old_root, new_root)
+        if table["added"] or table["removed"] or table["modified"]:
+            report["tables"][name[:-5]] = table
+    return report
+
+
+def print_summary(report: dict):
+    for table, changes in report["tables"].items():
+        texts = changes["texts"]
+        print(f"{table}: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+              f"{len(changes['modified'])} modified records; texts: {len(texts['added'])} added, "
+              f"{len(texts['removed'])} removed, {len(texts['changed'])} changed")
+    if report["added_tables"]:
+        print("Added tables:", ", ".join(report["added_tables"]))
+    if report["removed_tables"]:
+        print("Removed tables:", ", ".join(report["removed_tables"]))
+    if not (report["tables"] or report["added_tables"] or report["removed_tables"]):
+        print("No changes")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record-level change report between two versions of the master data json")
+    parser.add_argument('--old-dir', help="Folder of the old json tables")
+    parser.add_argument('--new-dir', help=f"Folder of the new json tables (default: {MASTER_JSON_DIR})")
+    parser.add_argument('--from', dest='from_rev', metavar="REV",
+                        help=f"Old version: {MASTER_JSON_DIR} at this git revision")
+    parser.add_argument('--to', dest='to_rev', metavar="REV",
+                        help=f"New version: {MASTER_JSON_DIR} at this git revision (default: the working tree)")
+    parser.add_argument('--output', '-o', default=REPORT_PATH, help="Where to write the json report")
+    args = parser.parse_args()
+
+    if bool(args.old_dir) == bool(args.from_rev):
+        parser.error("give exactly one of --old-dir and --from")
+    if args.new_dir and args.to_rev:
+        parser.error("--new-dir and --to cannot be combined")
+
+    try:
+        old = dir_snapshot(args.old_dir) if args.old_dir else git_snapshot(args.from_rev)
+        new = git_snapshot(args.to_rev) if args.to_rev else dir_snapshot(args.new_dir or MASTER_JSON_DIR)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    report = diff_snapshots(old, new)
+    print_summary(report)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json_format.dump(report, f, indent=4)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,2 @@
 cd gakumasu-diff/orig && git fetch && git checkout origin/main && cd ../..
-python scripts/gakumasu_diff_to_json.py
\ No newline at end of file
+python scripts/gakumasu_diff_to_json.py --since
\ No newline at end of file